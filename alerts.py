@@ -0,0 +1,196 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from frameschema import split_var
+from kivy.logger import Logger
+from time import time
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class AlertRules(object):
+    """
+    Threshold rules on the sampled vars, such as 'the rate of dcache:misses
+    is above X for N consecutive frames'. A rule is a mapping with the keys:
+
+        var     Name of the var, in which a '*' matches all instances
+        above   Threshold the measure has to exceed, or
+        below   threshold the measure has to stay under
+        rate    Whether the rate is measured instead of the value
+        frames  Number of consecutive frames the condition has to hold
+        pause   Whether to pause the simulation when the rule triggers
+
+    The rules are expanded over the matching vars and stored as arrays over
+    the frame's columns, so a chunk of rules is evaluated with a handful of
+    array operations. Chunks are evaluated round-robin within a time budget
+    per frame; a chunk that had to skip frames counts them as if its
+    condition held throughout, when it still holds.
+    """
+
+    def __init__(self, manyman, rules, names):
+        self.manyman = manyman
+
+        columns = []
+        use_rate = []
+        bounds = []
+        signs = []
+        frames = []
+        self.pause = []
+        self.components = []
+        self.descriptions = []
+
+        for rule in rules:
+            try:
+                if 'above' in rule:
+                    sign, threshold = 1., float(rule['above'])
+                else:
+                    sign, threshold = -1., float(rule['below'])
+                pattern = re.compile(
+                    '^%s$' % re.escape(rule['var']).replace(r'\*', '.+?')
+                )
+            except Exception, e:
+                Logger.error("AlertRules: Invalid rule %s: %s" % (rule, e))
+                continue
+
+            matched = False
+            for column, name in enumerate(names):
+                if not pattern.match(name):
+                    continue
+                matched = True
+                columns.append(column)
+                use_rate.append(bool(rule.get('rate', False)))
+                signs.append(sign)
+                bounds.append(sign * threshold)
+                frames.append(max(1, int(rule.get('frames', 1))))
+                self.pause.append(bool(rule.get('pause', False)))
+                self.components.append(split_var(name)[0])
+                self.descriptions.append("%s%s %s %s for %d frames" % (
+                    'rate of ' if use_rate[-1] else '',
+                    name,
+                    '>' if sign > 0 else '<',
+                    threshold,
+                    frames[-1]
+                ))
+            if not matched:
+                Logger.warning("AlertRules: No var matches %s" % rule['var'])
+
+        n = len(columns)
+        size = manyman.settings['alert_chunk_size']
+        self.chunks = [(s, min(s + size, n)) for s in range(0, n, size)]
+        self.evaluated = [0] * len(self.chunks)
+        self.next_chunk = 0
+        self.frame = 0
+
+        # Number of triggered rules per component
+        self.highlighted = dict()
+
+        if numpy is not None:
+            self.columns = numpy.array(columns, dtype=int)
+            self.use_rate = numpy.array(use_rate, dtype=bool)
+            self.signs = numpy.array(signs)
+            self.bounds = numpy.array(bounds)
+            self.frames = numpy.array(frames, dtype=int)
+            self.counts = numpy.zeros(n, dtype=int)
+            self.triggered = numpy.zeros(n, dtype=bool)
+        else:
+            self.columns = columns
+            self.use_rate = use_rate
+            self.signs = signs
+            self.bounds = bounds
+            self.frames = frames
+            self.counts = [0] * n
+            self.triggered = [False] * n
+
+    def __len__(self):
+        return len(self.columns)
+
+    def update(self, values, rates):
+        """
+        Evaluate the rules on a frame's values and rates, in schema order,
+        for as long as the time budget allows.
+        """
+        if not self.chunks:
+            return
+
+        self.frame += 1
+        start = time()
+        budget = self.manyman.settings['alert_budget']
+        for i in range(len(self.chunks)):
+            self.evaluate(self.next_chunk, values, rates)
+            self.next_chunk = (self.next_chunk + 1) % len(self.chunks)
+            if time() - start >= budget:
+                break
+
+    def evaluate(self, chunk, values, rates):
+        """Evaluate a single chunk of rules."""
+        s, e = self.chunks[chunk]
+        elapsed = self.frame - self.evaluated[chunk]
+        self.evaluated[chunk] = self.frame
+
+        if numpy is not None:
+            columns = self.columns[s:e]
+            measure = numpy.where(
+                self.use_rate[s:e],
+                numpy.asarray(rates)[columns],
+                numpy.asarray(values)[columns]
+            )
+            hit = measure * self.signs[s:e] > self.bounds[s:e]
+            self.counts[s:e] = numpy.where(hit, self.counts[s:e] + elapsed, 0)
+            firing = self.counts[s:e] >= self.frames[s:e]
+            for i in numpy.nonzero(firing != self.triggered[s:e])[0]:
+                self.set_triggered(s + i, firing[i])
+            return
+
+        for i in range(s, e):
+            if self.use_rate[i]:
+                measure = rates[self.columns[i]]
+            else:
+                measure = values[self.columns[i]]
+            if measure * self.signs[i] > self.bounds[i]:
+                self.counts[i] += elapsed
+            else:
+                self.counts[i] = 0
+            firing = self.counts[i] >= self.frames[i]
+            if firing != self.triggered[i]:
+                self.set_triggered(i, firing)
+
+    def set_triggered(self, i, triggered):
+        """Handle a rule that started or stopped triggering."""
+        self.triggered[i] = triggered
+        component = self.components[i]
+        count = self.highlighted.get(component, 0)
+        mm = self.manyman
+
+        if triggered:
+            Logger.warning("AlertRules: Triggered at cycle %d: %s" %
+                (mm.current_kernel_cycle, self.descriptions[i]))
+            self.highlighted[component] = count + 1
+            if count == 0 and component in mm.components_list:
+                mm.components_list[component].highlight()
+            if self.pause[i]:
+                mm.pause_session()
+        else:
+            self.highlighted[component] = count - 1
+            if count == 1 and component in mm.components_list:
+                mm.components_list[component].dehighlight()
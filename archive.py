@@ -0,0 +1,246 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from bisect import bisect_left
+from frameschema import FrameSchema
+from os.path import exists, join
+from struct import calcsize, pack_into, unpack_from
+import json
+import mmap
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+SCHEMA_FILE = 'schema.json'
+CYCLES_FILE = 'cycles.col'
+ARCHIVE_VERSION = 1
+
+# Every column holds little-endian doubles, which represent the integer
+# counters exactly up to 2^53
+DTYPE = '<d'
+ITEM_SIZE = calcsize(DTYPE)
+
+
+def column_file(index):
+    """Determine the file name of the column of the var with given index."""
+    return "var%05d.col" % index
+
+
+class Column(object):
+    """
+    Read-only view of a column in a memory-mapped file. Values are unpacked
+    from the mapping on access, so nothing is copied up front.
+    """
+
+    def __init__(self, data, rows):
+        self.data = data
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(self.rows))]
+        if i < 0:
+            i += self.rows
+        if not 0 <= i < self.rows:
+            raise IndexError('Column index out of range')
+        return unpack_from(DTYPE, self.data, i * ITEM_SIZE)[0]
+
+
+def open_column(data, rows):
+    """
+    Open a column of 'rows' values in the given mapping. Uses a numpy array
+    on top of the mapping when available.
+    """
+    if numpy is not None and rows > 0:
+        return numpy.frombuffer(data, dtype=DTYPE, count=rows)
+    return Column(data, rows)
+
+
+class ArchiveWriter(object):
+    """
+    Writer of a columnar archive of the sampled vars. The archive is a folder
+    with a schema header, a column with the kernel cycle of every frame and a
+    column per var. The column files are memory-mapped and grown by
+    'chunk_rows' rows at a time, so appending a frame only stores its values
+    into the mappings.
+    """
+
+    def __init__(self, folder, names, chip_name='', chunk_rows=4096):
+        self.folder = folder
+        self.schema = FrameSchema(names)
+        self.names = self.schema.full_names()
+        self.chip_name = chip_name
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.capacity = 0
+
+        if not exists(folder):
+            os.makedirs(folder)
+
+        self.files = [open(join(folder, CYCLES_FILE), 'w+b')]
+        for i in xrange(len(self.names)):
+            self.files.append(open(join(folder, column_file(i)), 'w+b'))
+        self.maps = [None] * len(self.files)
+
+        self.grow()
+
+    def grow(self):
+        """Grow all columns by a chunk and store the rows written so far."""
+        self.capacity += self.chunk_rows
+        size = self.capacity * ITEM_SIZE
+        for i, f in enumerate(self.files):
+            if self.maps[i]:
+                self.maps[i].close()
+            os.ftruncate(f.fileno(), size)
+            self.maps[i] = mmap.mmap(f.fileno(), size)
+
+        self.write_schema()
+
+    def append(self, cycle, values):
+        """Append a frame with given kernel cycle and values, in name order."""
+        if self.rows == self.capacity:
+            self.grow()
+
+        offset = self.rows * ITEM_SIZE
+        pack_into(DTYPE, self.maps[0], offset, cycle)
+        for data, value in zip(self.maps[1:], values):
+            pack_into(DTYPE, data, offset, value)
+        self.rows += 1
+
+    def append_frame(self, cycle, names, values):
+        """
+        Append a frame with given kernel cycle, of which the values are given
+        in the order of 'names'. Vars missing from the frame keep their
+        previous value.
+        """
+        self.append(cycle, self.schema.store(names, values))
+
+    def write_schema(self):
+        """
+        Write the schema header. The header holds the number of valid rows,
+        so it is replaced atomically.
+        """
+        schema = {
+            'version': ARCHIVE_VERSION,
+            'name': self.chip_name,
+            'dtype': DTYPE,
+            'rows': self.rows,
+            'cycles': CYCLES_FILE,
+            'vars': self.names,
+            'columns': [column_file(i) for i in xrange(len(self.names))]
+        }
+        path = join(self.folder, SCHEMA_FILE)
+        f = open(path + '.tmp', 'w')
+        json.dump(schema, f)
+        f.close()
+        os.rename(path + '.tmp', path)
+
+    def flush(self):
+        """Flush the columns to disk and store the rows written so far."""
+        for data in self.maps:
+            data.flush()
+        self.write_schema()
+
+    def close(self):
+        """Close the archive, trimming the columns to the rows written."""
+        for i, f in enumerate(self.files):
+            self.maps[i].close()
+            os.ftruncate(f.fileno(), self.rows * ITEM_SIZE)
+            f.close()
+        self.maps = []
+        self.files = []
+        self.write_schema()
+
+
+class ArchiveReader(object):
+    """
+    Read-only view of an archive written by ArchiveWriter. The columns are
+    memory-mapped, so reading a value or a range of values does not copy
+    the archive into memory.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+        f = open(join(folder, SCHEMA_FILE))
+        self.schema = json.load(f)
+        f.close()
+
+        if self.schema['version'] != ARCHIVE_VERSION or \
+            self.schema['dtype'] != DTYPE:
+            raise ValueError('Unsupported archive format: %s' % folder)
+
+        self.chip_name = self.schema['name']
+        self.names = self.schema['vars']
+        self.rows = self.schema['rows']
+
+        self.files = []
+        self.maps = []
+        self.cycles = self.open_file(self.schema['cycles'])
+        self.columns = [self.open_file(name) for name in self.schema['columns']]
+
+    def __len__(self):
+        return self.rows
+
+    def open_file(self, name):
+        """Map the column file with given name."""
+        f = open(join(self.folder, name), 'rb')
+        self.files.append(f)
+
+        if self.rows == 0:
+            return Column('', 0)
+
+        data = mmap.mmap(
+            f.fileno(),
+            self.rows * ITEM_SIZE,
+            access=mmap.ACCESS_READ
+        )
+        self.maps.append(data)
+        return open_column(data, self.rows)
+
+    def column(self, name):
+        """Retrieve the column of the var with given name."""
+        return self.columns[self.names.index(name)]
+
+    def row(self, i):
+        """Retrieve the values of all vars in the frame with given index."""
+        return [column[i] for column in self.columns]
+
+    def find(self, cycle):
+        """Determine the index of the first frame at or after given cycle."""
+        return bisect_left(self.cycles, cycle)
+
+    def close(self):
+        """Close the archive."""
+        self.cycles = None
+        self.columns = []
+        for data in self.maps:
+            data.close()
+        for f in self.files:
+            f.close()
+        self.maps = []
+        self.files = []
@@ -0,0 +1,143 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+
+class ArchivePlayer(object):
+    """
+    Plays an archive back through the core grid and its graphs, taking the
+    place of the simulator. Has the same pause, resume, delay, step,
+    selection and frequency controls as the communicator, so the controls of
+    the window need not know which of the two they drive.
+    """
+
+    def __init__(self, manyman, reader):
+        self.manyman = manyman
+        self.reader = reader
+        self.row = 0
+        self.steps = 0
+        self.running = False
+        self.delay = manyman.settings['archive_playback_delay']
+
+    def start(self):
+        """Start or resume the playback."""
+        if self.running:
+            return
+
+        self.running = True
+        Clock.schedule_interval(self.update, self.delay)
+        self.update_labels()
+
+    def stop(self):
+        """Pause the playback."""
+        self.running = False
+        Clock.unschedule(self.update)
+        self.update_labels()
+
+    def change_delay(self, delay):
+        """Set the delay between two played frames."""
+        self.delay = max(1e-3, delay)
+        if self.running:
+            Clock.unschedule(self.update)
+            Clock.schedule_interval(self.update, self.delay)
+        self.update_labels()
+
+    def set_step(self, steps):
+        """Pause after 'steps' more frames, or at the end when 0."""
+        self.steps = steps
+        self.update_labels()
+
+    def pause_sim(self):
+        """Pause the playback, as the pause control does."""
+        self.stop()
+
+    def resume_sim(self):
+        """Resume the playback, as the resume control does."""
+        self.start()
+
+    def selection_new(self, names):
+        """Handler for a new selection; the selection of an archive is fixed."""
+        Logger.warning("ArchivePlayer: The selection of an archive is fixed")
+
+    def set_core_frequency(self, freq, core=None):
+        """Handler for a frequency change; an archive can not be changed."""
+        pass
+
+    def cycle_range(self):
+        """Retrieve the first and last kernel cycle of the archive."""
+        if not len(self.reader):
+            return 0, 0
+        return int(self.reader.cycles[0]), int(self.reader.cycles[-1])
+
+    def seek(self, cycle):
+        """
+        Continue the playback from the given kernel cycle on, showing the
+        frame at that cycle right away. Going back rebuilds the grid, as the
+        histories of the vars only grow forward in time.
+        """
+        row = self.reader.find(cycle)
+        if row < self.row:
+            self.manyman.init_core_grid()
+        self.row = row
+        if self.row < len(self.reader):
+            self.play()
+
+    def update(self, dt):
+        """Play the next frame."""
+        if self.row >= len(self.reader):
+            Logger.info("ArchivePlayer: Reached the end of the archive")
+            self.stop()
+            return
+
+        self.play()
+
+        if self.steps > 0:
+            self.steps -= 1
+            if self.steps == 0:
+                self.stop()
+
+    def play(self):
+        """Apply the frame at the current row and move on to the next."""
+        self.manyman.apply_frame(
+            self.reader.cycles[self.row],
+            self.reader.names,
+            self.reader.row(self.row)
+        )
+        self.row += 1
+
+    def close(self):
+        """Stop the playback and close the archive."""
+        self.stop()
+        self.reader.close()
+
+    def update_labels(self):
+        """Show the state of the playback in the right sidebar."""
+        mm = self.manyman
+        if mm.status_label is None:
+            return
+
+        if self.running:
+            mm.status_label.text = "archive playback\n\nrunning"
+        else:
+            mm.status_label.text = "archive playback\n\npaused"
+        mm.delay_label.text = "current play delay\n\n" + str(self.delay)
+        mm.step_label.text = "current steps\n\n" + str(self.steps)
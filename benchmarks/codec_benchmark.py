@@ -0,0 +1,117 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from os.path import abspath, dirname, join
+from time import time
+import sys
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from codec import available_codecs, select_codec
+
+USAGE = """Decode benchmark of the available JSON codecs over recorded messages.
+
+Record messages by setting 'record_messages' to a file name in the settings
+file, then run:
+
+    python benchmarks/codec_benchmark.py <recorded file> [repeat]"""
+
+
+def load_messages(path):
+    """Load the recorded messages, one message per line."""
+    f = open(path, "r")
+    messages = [line.rstrip('\n') for line in f if line.strip()]
+    f.close()
+    return messages
+
+
+def message_types(stdlib, messages):
+    """Group the messages by their message type."""
+    types = dict()
+    for msg in messages:
+        types.setdefault(stdlib.loads(msg)['type'], []).append(msg)
+    return types
+
+
+def bench(codec, messages, repeat):
+    """Determine the best total time of decoding all given messages."""
+    best = None
+    for i in xrange(repeat):
+        start = time()
+        for msg in messages:
+            codec.loads(msg)
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(args):
+    if len(args) < 2:
+        print USAGE
+        return 1
+
+    messages = load_messages(args[1])
+    repeat = 5
+    if len(args) > 2:
+        repeat = int(args[2])
+
+    codecs = available_codecs()
+    stdlib = codecs[-1]
+    types = message_types(stdlib, messages)
+    nbytes = sum(len(msg) for msg in messages)
+
+    print "%d messages, %.1f MB, codecs: %s" % (
+        len(messages),
+        nbytes / 1e6,
+        ", ".join(c.name for c in codecs)
+    )
+    print "Selected at startup: %s" % select_codec().name
+    print
+
+    baseline = bench(stdlib, messages, repeat)
+    print "%-12s %10s %12s %10s %8s" % \
+        ("codec", "total (s)", "per msg (us)", "MB/s", "speedup")
+    for codec in codecs:
+        elapsed = bench(codec, messages, repeat)
+        print "%-12s %10.3f %12.1f %10.1f %7.2fx" % (
+            codec.name,
+            elapsed,
+            elapsed / max(1, len(messages)) * 1e6,
+            nbytes / 1e6 / max(1e-9, elapsed),
+            baseline / max(1e-9, elapsed)
+        )
+
+    print
+    print "Per message type (us per message):"
+    print "%-16s %8s" % ("type", "count") + \
+        "".join(" %12s" % c.name for c in codecs)
+    for name, msgs in sorted(types.items()):
+        line = "%-16s %8d" % (name, len(msgs))
+        for codec in codecs:
+            elapsed = bench(codec, msgs, repeat)
+            line += " %12.1f" % (elapsed / len(msgs) * 1e6)
+        print line
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
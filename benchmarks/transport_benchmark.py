@@ -0,0 +1,185 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from os.path import abspath, dirname, join
+from time import time
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+import transport
+
+USAGE = """Throughput benchmark of the transports between back-end and front-end.
+
+Sends the same stream of messages over TCP, a Unix-domain socket and the
+shared-memory rings from a forked sender process, and receives it the way
+the communicator does. On a single CPU the shared-memory address falls
+back to a Unix-domain socket, as it does for the front-end. Uses recorded messages when given (set
+'record_messages' to a file name in the settings file), and synthetic
+sim_data frames otherwise:
+
+    python benchmarks/transport_benchmark.py [recorded file] [repeat]"""
+
+
+def load_messages(path):
+    """Load the recorded messages, one message per line."""
+    f = open(path, "r")
+    messages = [line.rstrip('\n') for line in f if line.strip()]
+    f.close()
+    return messages
+
+
+def synthetic_messages(count=1000, nvars=200):
+    """Generate sim_data frames of 'nvars' values each."""
+    names = ", ".join('"cpu%d:pipeline.executed"' % i for i in xrange(nvars))
+    messages = []
+    for cycle in xrange(count):
+        values = ", ".join(str(cycle * 7 + i) for i in xrange(nvars))
+        messages.append(
+            '{"type": "sim_data", "content": {"cycle": %d, "names": [%s], '
+            '"values": [%s]}}' % (cycle, names, values)
+        )
+    return messages
+
+
+def send_stream(sock, messages, repeat):
+    """Send the messages 'repeat' times, one write per message."""
+    for i in xrange(repeat):
+        for msg in messages:
+            sock.sendall("%s\n" % msg)
+
+
+def receive_stream(sock, nbytes, bufsize):
+    """Receive 'nbytes' bytes and split them into messages."""
+    received = 0
+    count = 0
+    readbuf = ""
+    while received < nbytes:
+        data = sock.recv(bufsize)
+        if not data:
+            break
+        received += len(data)
+        if '\n' in data:
+            parts = data.split('\n')
+            count += len(parts) - 1
+            readbuf = parts[-1]
+        else:
+            readbuf += data
+    return count
+
+
+def bench(address, messages, repeat, bufsize):
+    """
+    Determine the time it takes to receive the stream over the transport of
+    the given address, and the number of messages received.
+    """
+    kind, where = transport.resolve(address)
+    if kind == 'shm':
+        server = transport.listen_shm(address)
+    else:
+        server = transport.listen(address)
+
+    pid = os.fork()
+    if pid == 0:
+        # Sender process
+        try:
+            if kind == 'shm':
+                sock = server
+            else:
+                sock, peer = server.accept()
+            send_stream(sock, messages, repeat)
+            if kind != 'shm':
+                sock.close()
+        finally:
+            os._exit(0)
+
+    start = time()
+    sock = transport.connect(address)
+    count = receive_stream(
+        sock,
+        repeat * sum(len(msg) + 1 for msg in messages),
+        bufsize
+    )
+    elapsed = time() - start
+    os.waitpid(pid, 0)
+
+    sock.close()
+    server.close()
+    if kind == 'shm':
+        os.unlink("%s-up" % where)
+        os.unlink("%s-down" % where)
+    elif kind == 'unix':
+        os.unlink(where)
+    return elapsed, count
+
+
+def main(args):
+    if len(args) > 1 and args[1] in ('-h', '--help'):
+        print USAGE
+        return 1
+
+    if len(args) > 1:
+        messages = load_messages(args[1])
+    else:
+        messages = synthetic_messages()
+    repeat = 5
+    if len(args) > 2:
+        repeat = int(args[2])
+
+    nbytes = repeat * sum(len(msg) + 1 for msg in messages)
+    folder = tempfile.mkdtemp()
+    shm_folder = '/dev/shm' if os.path.isdir('/dev/shm') else folder
+    transports = [
+        ('tcp', ['127.0.0.1', 23457]),
+        ('unix', 'unix:%s' % join(folder, 'transport.sock')),
+        ('shm', 'shm:%s' % join(shm_folder, 'manyman-bench-%d' % os.getpid()))
+    ]
+
+    print "%d messages x %d, %.1f MB" % (len(messages), repeat, nbytes / 1e6)
+    print
+
+    print "%-10s %10s %12s %10s %8s" % \
+        ("transport", "total (s)", "per msg (us)", "MB/s", "speedup")
+    baseline = None
+    for bufsize in (1024, 65536):
+        print "bufsize %d:" % bufsize
+        for name, address in transports:
+            if transport.falls_back(address):
+                name = "%s (%s)" % (name, transport.resolve(address)[0])
+            elapsed, count = bench(address, messages, repeat, bufsize)
+            if baseline is None:
+                baseline = elapsed
+            print "%-10s %10.3f %12.1f %10.1f %7.2fx" % (
+                name,
+                elapsed,
+                elapsed / max(1, count) * 1e6,
+                nbytes / 1e6 / max(1e-9, elapsed),
+                baseline / max(1e-9, elapsed)
+            )
+        baseline = None
+
+    os.rmdir(folder)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
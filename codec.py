@@ -0,0 +1,116 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from time import time
+import json
+
+
+# Frame used to calibrate the codecs, shaped like a large sim_data message
+calibration_frame = json.dumps({
+    'type': 'sim_data',
+    'content': {
+        'status': {'delay': 0.5, 'sim': 1, 'step': 0},
+        'data': dict(
+            ('cpu%d:pipeline.stage%d.count' % (i / 8, i % 8), i * 1234567)
+            for i in range(2000)
+        )
+    }
+})
+
+
+class Codec(object):
+    """JSON encoder and decoder pair of a single JSON library."""
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return "<Codec %s>" % self.name
+
+
+def available_codecs():
+    """Retrieve all JSON codecs that can be imported, stdlib json last."""
+    codecs = []
+
+    try:
+        import ujson
+        codecs.append(Codec('ujson', ujson.loads, ujson.dumps))
+    except ImportError:
+        pass
+
+    try:
+        import cjson
+        codecs.append(Codec('cjson', cjson.decode, cjson.encode))
+    except ImportError:
+        pass
+
+    try:
+        import simplejson
+        codecs.append(Codec('simplejson', simplejson.loads, simplejson.dumps))
+    except ImportError:
+        pass
+
+    codecs.append(Codec('json', json.loads, json.dumps))
+    return codecs
+
+
+def time_decode(codec, msg, repeat):
+    """Determine the best time of 'repeat' decodes of the given message."""
+    best = None
+    for i in xrange(repeat):
+        start = time()
+        codec.loads(msg)
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def select_codec(preference='auto', repeat=3):
+    """
+    Select the JSON codec to use. Either the codec with the preferred name,
+    or, for 'auto', the fastest codec that decodes the calibration frame the
+    same way the stdlib json module does.
+    """
+    codecs = available_codecs()
+    stdlib = codecs[-1]
+
+    if preference != 'auto':
+        for codec in codecs:
+            if codec.name == preference:
+                return codec
+        return stdlib
+
+    expected = stdlib.loads(calibration_frame)
+    best, best_time = stdlib, time_decode(stdlib, calibration_frame, repeat)
+    for codec in codecs[:-1]:
+        try:
+            if codec.loads(calibration_frame) != expected:
+                continue
+            elapsed = time_decode(codec, calibration_frame, repeat)
+        except Exception:
+            continue
+
+        if elapsed < best_time:
+            best, best_time = codec, elapsed
+
+    return best
@@ -18,57 +18,214 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from collections import deque
 from messageprocessor import MessageProcessor
 from kivy.logger import Logger
-from threading import Thread
-import json
-import socket
+from relay import RelayHub
+from threading import Condition, Thread
+from time import time
+import transport
+
+
+# Optional protocol features the front-end supports. The back-end announces
+# the ones it supports as well in its server_init message.
+client_capabilities = (
+    'output_push',
+    'status_delta'
+)
+
+# Message types of which only the most recently queued one has to be sent.
+coalesced_msg_types = (
+    'change_delay',
+    'set_step'
+)
+
+# Message types that can be combined into a single task_batch message.
+batched_msg_types = (
+    'task_start',
+    'task_move',
+    'task_pause',
+    'task_resume',
+    'task_stop',
+    'task_duplicate'
+)
+
+
+class MessageWriter(Thread):
+    """
+    Writer that sends queued messages to the back-end, so that callers never
+    block on the socket.
+    """
+
+    def __init__(self, sock, codec):
+        self.sock = sock
+        self.codec = codec
+        self.running = True
+        self.queue = deque()
+        self.cond = Condition()
+
+        Thread.__init__(self)
+        self.daemon = True
+
+    def put(self, msg, first=False):
+        """
+        Queue the given message, ahead of all others when 'first'. Replaces a
+        queued message of the same type for messages of which only the latest
+        one matters.
+        """
+        self.cond.acquire()
+        try:
+            if msg['type'] in coalesced_msg_types:
+                for queued in list(self.queue):
+                    if queued['type'] == msg['type']:
+                        self.queue.remove(queued)
+            if first:
+                self.queue.appendleft(msg)
+            else:
+                self.queue.append(msg)
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+    def stop(self):
+        """Stop the writer once all queued messages have been sent."""
+        self.cond.acquire()
+        self.running = False
+        self.cond.notify()
+        self.cond.release()
+
+    def run(self):
+        """Continuously send queued messages."""
+        try:
+            while True:
+                self.cond.acquire()
+                try:
+                    while self.running and not self.queue:
+                        self.cond.wait()
+                    if not self.queue:
+                        break
+                    msg = self.queue.popleft()
+                finally:
+                    self.cond.release()
+
+                data = self.codec.dumps(msg)
+                Logger.debug("Communicator: Sending: %s" % data)
+                self.sock.sendall("%s\n" % data)
+        except Exception, e:
+            Logger.error("Communicator: Could not send message: %s" % e)
+            self.running = False
 
 
 class Communicator(Thread):
-    """Communicator between ManyMan's front- and back-end."""
+    """
+    Communicator between ManyMan's front- and back-end. Connects right away,
+    or, when 'connect' is False, on its own thread once started. Messages
+    sent before the connection is made are queued.
+    """
 
-    def __init__(self, manyman):
+    def __init__(self, manyman, connect=True):
         self.manyman = manyman
 
         self.sock = None
+        self.codec = None
+        self.record = None
+        self.writer = None
+        self.batch = None
+        self.relay = None
         self.running = True
         self.initialized = False
         self.readbuf = ""
+        self.received_at = time()
 
+        self.init_codec()
         self.init_processor()
-        self.init_connection()
+        self.init_relay()
+        self.writer = MessageWriter(None, self.codec)
+        if connect:
+            self.init_connection()
 
         Thread.__init__(self)
 
+    def init_codec(self):
+        """
+        Take the JSON codec the application selected and open the file the
+        received messages are recorded to, if any.
+        """
+        self.codec = self.manyman.codec
+
+        if self.manyman.settings['record_messages']:
+            self.record = open(self.manyman.settings['record_messages'], "a")
+
     def init_processor(self):
         """Initialize the messageprocessor."""
         self.processor = MessageProcessor(self)
+        self.processor.start(self.manyman.decode_pool)
+
+    def init_relay(self):
+        """
+        Start re-broadcasting the received messages to local viewers, if
+        enabled. Only the application's own connection is relayed, not those
+        of additional simulators.
+        """
+        settings = self.manyman.settings
+        if settings['relay_listen'] and self.manyman.app is self.manyman:
+            self.relay = RelayHub(
+                settings['relay_listen'],
+                self.request_status_resync,
+                settings['relay_max_queue']
+            )
+            self.relay.start()
 
     def init_connection(self):
         """
         Initialize the connection to the back-end and send the initialization
         message.
         """
+        capabilities = list(client_capabilities)
+        if self.relay:
+            # Relayed statuses may be dropped for slow viewers, so every
+            # status has to be a full snapshot
+            capabilities.remove('status_delta')
+
+        if transport.falls_back(self.manyman.address):
+            Logger.warning(
+                "Communicator: Shared memory is slow on a single CPU, using "
+                "%s instead" % transport.describe(self.manyman.address)
+            )
+
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect(tuple(self.manyman.settings['address']))
-            Logger.info("Communicator: Connected to the server")
+            self.sock = transport.connect(
+                self.manyman.address,
+                self.manyman.settings['connect_timeout']
+            )
+            Logger.info("Communicator: Connected to %s" % self.manyman.name)
 
-            self.send_msg({
+            # The initialization message goes ahead of anything queued before
+            # the connection was made
+            self.writer.put({
                 'type': 'client_init',
                 'content': {
-                    'name': 'PQ Labs Q3'
+                    'name': 'PQ Labs Q3',
+                    'capabilities': capabilities
                 }
-            })
+            }, first=True)
+            self.writer.sock = self.sock
+            self.writer.start()
         except Exception as e:
             Logger.critical(
-                "Communicator: Could not connect to the server: %s" % e
+                "Communicator: Could not connect to %s: %s" %
+                (self.manyman.name, e)
             )
             raise e
 
     def run(self):
-        """Continuously check for messages."""
+        """Connect, if not connected yet, and continuously check for messages."""
+        if not self.sock:
+            try:
+                self.init_connection()
+            except Exception:
+                self.running = False
+
         try:
             while self.running:
                 data = self.sock.recv(self.manyman.settings['bufsize'])
@@ -77,27 +234,111 @@ class Communicator(Thread):
                     self.running = False
                     break
 
+                self.received_at = time()
+                self.manyman.counters.count_received(len(data))
+
                 if '\n' in data:
                     # Data is not complete until a newline character has been
                     # received
                     parts = data.split('\n')
-                    self.processor.process("%s%s" % (self.readbuf, parts[0]))
+                    self.dispatch("%s%s" % (self.readbuf, parts[0]))
 
                     # Process any adjacent fully received messages
                     for part in parts[1:-1]:
-                        self.processor.process(part)
+                        self.dispatch(part)
 
                     self.readbuf = parts[-1]
                 else:
                     self.readbuf += data
         except:
             self.running = False
+            self.writer.stop()
             self.sock.close()
 
+        if self.relay:
+            self.relay.close()
+
+        if self.record:
+            self.record.close()
+
+    def dispatch(self, msg):
+        """Record and process a single received message."""
+        if self.record:
+            self.record.write("%s\n" % msg)
+        if self.relay:
+            self.relay.broadcast(msg)
+        self.processor.process(msg)
+
+    def close(self):
+        """Send the remaining queued messages and close the connection."""
+        self.running = False
+        self.processor.stop()
+        self.writer.stop()
+        if self.writer.is_alive():
+            self.writer.join(1.0)
+        if self.sock:
+            self.sock.close()
+        if self.relay:
+            self.relay.close()
+
     def send_msg(self, msg):
-        """Send a given message to the back-end."""
-        Logger.debug("Communicator: Sending: %s" % json.dumps(msg))
-        self.sock.send("%s\n" % json.dumps(msg))
+        """
+        Queue a given message to be sent to the back-end. Task control
+        messages are collected instead while a batch is open.
+        """
+        if self.batch is not None and msg['type'] in batched_msg_types:
+            self.batch.append(msg)
+        else:
+            self.writer.put(msg)
+
+    def start_batch(self):
+        """Start collecting task control messages into a batch."""
+        if self.batch is None:
+            self.batch = []
+
+    def send_batch(self):
+        """Send all task control messages collected since start_batch."""
+        batch, self.batch = self.batch, None
+        if not batch:
+            return
+
+        if len(batch) == 1:
+            self.send_msg(batch[0])
+            return
+
+        operations = []
+        for msg in batch:
+            op = {'type': msg['type']}
+            op.update(msg['content'])
+            operations.append(op)
+
+        self.send_msg({
+            'type': 'task_batch',
+            'content': {
+                'operations': operations
+            }
+        })
+
+    def move_tasks(self, tasks, dest=None):
+        """Send task_move operations for all given tasks at once."""
+        self.start_batch()
+        for task in tasks:
+            self.move_task(task, dest)
+        self.send_batch()
+
+    def pause_tasks(self, tasks):
+        """Send task_pause operations for all given task ids at once."""
+        self.start_batch()
+        for task in tasks:
+            self.pause_task(task)
+        self.send_batch()
+
+    def resume_tasks(self, tasks, core=None):
+        """Send task_resume operations for all given task ids at once."""
+        self.start_batch()
+        for task in tasks:
+            self.resume_task(task, core)
+        self.send_batch()
 
     def start_task(self, name, task, core=None):
         """Send a start_task message."""
@@ -175,6 +416,54 @@ class Communicator(Thread):
             msg['content']['offset'] = offset
         self.send_msg(msg)
 
+    def subscribe_output(self, task, offset=0, window=None):
+        """
+        Send a task_output_subscribe message. The back-end will push new
+        output from the given offset on, with at most 'window' unacknowledged
+        bytes in flight.
+        """
+        msg = {
+            'type': 'task_output_subscribe',
+            'content': {
+                'id': task
+            }
+        }
+        if offset > 0:
+            msg['content']['offset'] = offset
+        if window != None:
+            msg['content']['window'] = window
+        self.send_msg(msg)
+
+    def unsubscribe_output(self, task):
+        """Send a task_output_unsubscribe message."""
+        self.send_msg({
+            'type': 'task_output_unsubscribe',
+            'content': {
+                'id': task
+            }
+        })
+
+    def ack_output(self, task, nbytes):
+        """
+        Send a task_output_ack message, granting the back-end room for
+        'nbytes' more bytes of pushed output.
+        """
+        self.send_msg({
+            'type': 'task_output_ack',
+            'content': {
+                'id': task,
+                'bytes': nbytes
+            }
+        })
+
+    def request_status_resync(self):
+        """Send a status_resync message, requesting a full snapshot."""
+        self.send_msg({
+            'type': 'status_resync',
+            'content': {
+            }
+        })
+
     def set_core_frequency(self, freq, core=None):
         """Send a core_set_frequency message with given frequency."""
         msg = {
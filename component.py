@@ -26,7 +26,10 @@ from kivy.uix.button import Button
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
 from kivy.uix.scrollview import ScrollView
+from kivy.uix.textinput import TextInput
+from frameschema import join_var
 from perfgraph import PerfGraph
+from timeseries import CycleHistory
 from util import frange
 from valueslider import ValueSlider
 
@@ -71,6 +74,9 @@ class Component(Button):
         self.box2 = BoxLayout(orientation='vertical', size_hint_x=None, width=300)
         self.data2 = dict()
         self.scroll2 = None
+        self.query_input = None
+        self.query_text = ''
+        self.pin_button = None
 
         settings = {
             'text': self.info_text(),
@@ -134,6 +140,22 @@ class Component(Button):
         self.label.bind(texture_size=self.label.setter('size'))
         self.scroll2.add_widget(self.label)
         self.box2.add_widget(self.scroll2)
+
+        # Query the history of the selected var by kernel cycle: either
+        # 'cycle' or 'start-end'
+        self.query_input = TextInput(
+            multiline=False,
+            size_hint_y=None,
+            height=30
+        )
+        self.query_input.bind(on_text_validate=self.query_history)
+
+        self.pin_button = Button(
+            text='Pin for correlation',
+            size_hint_y=None,
+            height=30
+        )
+        self.pin_button.bind(on_press=self.toggle_pin)
         #self.box2.add_widget(self.cpu_graph)
         layout.add_widget(box)
         layout.add_widget(self.box2)
@@ -215,6 +237,9 @@ class Component(Button):
         """Handler when the frequency is set."""
         Logger.info("Core: Set frequency to: %s" % ins.val)
         self._frequency = ins.val
+        if not self.manyman.comm:
+            # Not connected, as while browsing an archive
+            return
         self.manyman.comm.set_core_frequency(ins.val, self.index)
 
     def info_show(self, *largs):
@@ -275,11 +300,12 @@ class Component(Button):
         else:
             self.viz_load = self.load
             
-        load3 = 0.0
-        for l in self.load2.values():
-            load3 += float(l)
-            
-        load3 = load3/len(self.load2)
+        load3 = self.activity()
+
+        # Compared to another back-end, show how differently it behaves
+        reference = self.manyman.reference_component(self.index)
+        if reference is not None and self.manyman.diff_view:
+            load3 = abs(load3 - reference.activity())
         
         # Determine the new color
         cr = self.manyman.settings['core_color_range']
@@ -302,6 +328,12 @@ class Component(Button):
         #        max(0, (self.height - 2 * p) * self.load2[k]) # was self.viz_load
         #    ]
 
+    def activity(self):
+        """Determine the fraction of this component's vars that changed."""
+        if not self.load2:
+            return 0.0
+        return sum(self.load2.values()) / float(len(self.load2))
+
     def update_load(self, load):
         """Update this core's CPU load."""
         self.load = load
@@ -318,42 +350,48 @@ class Component(Button):
         """Update this core's memory usage."""
         self.mem_graph.update
         
-    def update_data(self, k, v):
-        """Update this core's memory usage."""
-        if len(self.data[k]) < 1:
-            self.data[k].append(v)
-        
-        if self.data[k]:
-            t = self.manyman.current_kernel_cycle - self.manyman.previous_kernel_cycle
-            c = 0
-            if t != 0:
-                c = (v - self.data[k][-1])*(1.0)/t
+    def update_frame(self, keys, values, rates, changed, integral):
+        """
+        Update the given vars of this component at once, with their rates,
+        changed flags and whether they only took whole numbers, as computed
+        for the whole frame.
+        """
+        cycle = self.manyman.current_kernel_cycle
+        for k, v, c, ch, i in zip(keys, values, rates, changed, integral):
+            # Only the first sample and the changes are stored
+            self.data[k].append(cycle, v, bool(i))
+
             self.data2[k][1].update(c * 100)
-            
-            if v != self.data[k][-1]:
+
+            if ch:
                 #self.update_load(1.0)
                 self.load2[k] = 1
-                self.data[k].append(v)
                 self.data2[k][0].background_color = (0,1,0,1)
             else:
                 #self.update_load(0.0)
                 self.load2[k] = 0
                 self.data2[k][0].background_color = (1,1,1,1)
-                
-        if len(self.data[k]) > 5:
-            del self.data[k][0]
-            
+
+        if self.manyman.leaderboard:
+            if self.manyman.settings['leaderboard_measure'] == 'rate':
+                score = sum(abs(c) for c in rates)
+            else:
+                score = self.activity()
+            self.manyman.leaderboard.update(self.index, score)
+
         self.update(0)
-        
+
         if not self.info_showing:
             return
         
         if self.current in self.data:
-            self.label.text = self.current + '\n\n' + '\n'.join(str(x) for x in self.data[unicode(self.current)][-5:])
+            self.label.text = self.history_text()
             
     def set_data(self, k):
         """Update this core's memory usage."""
-        self.data[k] = []
+        self.data[k] = CycleHistory(
+            self.manyman.settings['cycle_history_capacity']
+        )
         self.load2[k] = 0
         
         #with self.canvas:
@@ -375,13 +413,81 @@ class Component(Button):
         
     def dostuff(self, *largs):
         self.current = largs[0].text
-        self.label.text = self.current + '\n\n' + '\n'.join(str(x) for x in self.data[unicode(self.current)][-5:])
+        self.query_text = ''
+        self.label.text = self.history_text()
         self.box2.clear_widgets()
         self.box2.add_widget(self.scroll2)
+        self.box2.add_widget(self.query_input)
+        if self.manyman.correlation is not None:
+            # Only sessions with a correlation view can pin vars
+            self.box2.add_widget(self.pin_button)
+            self.update_pin_button()
         self.box2.add_widget(self.data2[unicode(self.current)][1])
+
+    def update_pin_button(self):
+        """Show whether the selected var is pinned for correlation."""
+        name = join_var(self.index, self.current)
+        if name in self.manyman.correlation_vars:
+            self.pin_button.text = 'Unpin from correlation'
+        else:
+            self.pin_button.text = 'Pin for correlation'
+
+    def toggle_pin(self, *largs):
+        """Handler when the pin button is pressed."""
+        if self.current is None:
+            return
+        self.manyman.toggle_correlation_var(join_var(self.index, self.current))
+        self.update_pin_button()
+
+    def history_text(self):
+        """
+        Render the last changes of the selected var with the cycles they
+        happened at, followed by the result of the last history query.
+        """
+        history = self.data[unicode(self.current)]
+        text = self.current + '\n\n' + '\n'.join(
+            "%d: %s" % (c, v) for c, v in history.last(5)
+        )
+        if self.query_text:
+            text += '\n\n' + self.query_text
+        return text
+
+    def query_history(self, ins):
+        """
+        Handler when a history query is entered. A single cycle shows the
+        value at that cycle and the first change after it, a 'start-end'
+        range shows all values in effect during that range.
+        """
+        if self.current is None:
+            return
+
+        history = self.data[unicode(self.current)]
+        try:
+            bounds = [int(b) for b in ins.text.split('-')]
+        except ValueError:
+            self.query_text = "Invalid query: %s" % ins.text
+            self.label.text = self.history_text()
+            return
+
+        if len(bounds) == 1:
+            value = history.value_at(bounds[0])
+            change = history.first_change_after(bounds[0])
+            self.query_text = "at cycle %d: %s\nfirst change after: %s" % (
+                bounds[0],
+                value,
+                "%d: %s" % change if change else "none"
+            )
+        elif len(bounds) == 2:
+            self.query_text = "cycles %d-%d:\n" % tuple(bounds) + '\n'.join(
+                "%d: %s" % (c, v) for c, v in history.between(*bounds)
+            )
+        else:
+            self.query_text = "Invalid query: %s" % ins.text
+
+        self.label.text = self.history_text()
         
     def get_data(self, k):
-        """Update this core's memory usage."""
+        """Retrieve the cycle-tagged history of the given var."""
         #print "WTTTTTTTTTTTTTTTF"
         return self.data[k]
 
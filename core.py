@@ -180,6 +180,9 @@ class Core(Button):
         """Handler when the frequency is set."""
         Logger.info("Core: Set frequency to: %s" % ins.val)
         self._frequency = ins.val
+        if not self.manyman.comm:
+            # Not connected, as while browsing an archive
+            return
         self.manyman.comm.set_core_frequency(ins.val, self.index)
 
     def info_show(self, *largs):
@@ -269,6 +272,14 @@ class Core(Button):
         """Update this core's memory usage."""
         self.mem_graph.update(load * 100)
 
+    def sample(self, load, mem):
+        """
+        Feed the performance graphs an unchanged CPU load and memory usage,
+        without updating anything else.
+        """
+        self.cpu_graph.update(load * 100)
+        self.mem_graph.update(mem * 100)
+
     def info_text(self):
         """Retrieve the core's info text."""
         return "Core %d\n(%d tasks)" % (
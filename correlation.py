@@ -0,0 +1,206 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.uix.widget import Widget
+from math import sqrt
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SlidingCorrelation(object):
+    """
+    Correlation matrix of the rates of k pinned vars over the last 'window'
+    frames. The sums and the sums of products are updated incrementally, by
+    adding the newest frame and subtracting the one leaving the window, so a
+    frame costs O(k^2) regardless of the window. The sums are recomputed from
+    the window once every 'window' frames, to keep rounding errors from
+    accumulating.
+    """
+
+    def __init__(self, names, columns, window):
+        self.names = names
+        self.columns = columns
+        self.window = max(2, window)
+        self.count = 0
+        self.head = 0
+        self.frames = 0
+
+        k = len(columns)
+        if numpy is not None:
+            self.columns = numpy.array(columns, dtype=int)
+            self.ring = numpy.zeros((self.window, k))
+            self.sums = numpy.zeros(k)
+            self.products = numpy.zeros((k, k))
+        else:
+            self.ring = [[0.] * k for i in xrange(self.window)]
+            self.sums = [0.] * k
+            self.products = [[0.] * k for i in xrange(k)]
+
+    def __len__(self):
+        return len(self.columns)
+
+    def add(self, rates):
+        """Add a frame's rates, in schema order, to the window."""
+        if not len(self.columns):
+            return
+
+        full = self.count == self.window
+        if not full:
+            self.count += 1
+
+        if numpy is not None:
+            x = numpy.asarray(rates, dtype=float)[self.columns]
+            old = self.ring[self.head].copy()
+            self.ring[self.head] = x
+            self.sums += x - old
+            self.products += numpy.outer(x, x) - numpy.outer(old, old)
+        else:
+            x = [float(rates[c]) for c in self.columns]
+            old = self.ring[self.head]
+            self.ring[self.head] = x
+            k = len(x)
+            for i in xrange(k):
+                self.sums[i] += x[i] - old[i]
+                row = self.products[i]
+                for j in xrange(k):
+                    row[j] += x[i] * x[j] - old[i] * old[j]
+
+        self.head = (self.head + 1) % self.window
+        self.frames += 1
+        if self.frames % self.window == 0:
+            self.recompute()
+
+    def recompute(self):
+        """Recompute the sums from the frames in the window."""
+        if numpy is not None:
+            self.sums = self.ring.sum(axis=0)
+            self.products = numpy.dot(self.ring.T, self.ring)
+            return
+
+        k = len(self.columns)
+        self.sums = [sum(x[i] for x in self.ring) for i in xrange(k)]
+        self.products = [
+            [sum(x[i] * x[j] for x in self.ring) for j in xrange(k)]
+            for i in xrange(k)
+        ]
+
+    def matrix(self):
+        """
+        Determine the correlation matrix. Vars that were constant over the
+        window correlate with nothing.
+        """
+        n = float(self.count)
+        if numpy is not None:
+            cov = n * self.products - numpy.outer(self.sums, self.sums)
+            var = numpy.maximum(numpy.diag(cov), 0.)
+            denom = numpy.sqrt(numpy.outer(var, var))
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                r = numpy.where(denom > 0, cov / denom, 0.)
+            return numpy.clip(r, -1., 1.)
+
+        k = len(self.columns)
+        s = self.sums
+        cov = [
+            [n * self.products[i][j] - s[i] * s[j] for j in xrange(k)]
+            for i in xrange(k)
+        ]
+        var = [max(cov[i][i], 0.) for i in xrange(k)]
+        r = []
+        for i in xrange(k):
+            row = []
+            for j in xrange(k):
+                denom = sqrt(var[i] * var[j])
+                if denom > 0:
+                    row.append(max(-1., min(1., cov[i][j] / denom)))
+                else:
+                    row.append(0.)
+            r.append(row)
+        return r
+
+
+def heatmap(matrix):
+    """
+    Render a correlation matrix as RGBA bytes, with the first row at the top.
+    Positive correlations are red, negative ones blue.
+    """
+    if numpy is not None:
+        r = numpy.asarray(matrix)[::-1]
+        pixels = numpy.zeros(r.shape + (4,), dtype=numpy.uint8)
+        pixels[..., 0] = numpy.maximum(r, 0.) * 255
+        pixels[..., 2] = numpy.maximum(-r, 0.) * 255
+        pixels[..., 3] = 255
+        return pixels.tostring()
+
+    pixels = array('B')
+    for row in reversed(matrix):
+        for r in row:
+            pixels.extend((
+                int(max(r, 0.) * 255),
+                0,
+                int(max(-r, 0.) * 255),
+                255
+            ))
+    return pixels.tostring()
+
+
+class CorrelationView(Widget):
+    """Heatmap of the correlation matrix, drawn as a single texture."""
+
+    def __init__(self, manyman, **kwargs):
+        self.manyman = manyman
+        self.texture = None
+
+        super(CorrelationView, self).__init__(**kwargs)
+
+        with self.canvas:
+            Color(1, 1, 1)
+            self.rect = Rectangle(pos=self.pos, size=self.size)
+
+        self.bind(pos=self.update_rect, size=self.update_rect)
+
+    def update_rect(self, *largs):
+        """Handler when the view is moved or resized."""
+        self.rect.pos = self.pos
+        self.rect.size = self.size
+
+    def update(self, *largs):
+        """Upload the current correlation matrix into the texture."""
+        correlation = self.manyman.correlation
+        if not correlation:
+            return
+
+        k = len(correlation)
+        if self.texture is None or self.texture.size != (k, k):
+            self.texture = Texture.create(size=(k, k), colorfmt='rgba')
+            self.texture.mag_filter = 'nearest'
+            self.rect.texture = self.texture
+
+        self.texture.blit_buffer(
+            heatmap(correlation.matrix()),
+            colorfmt='rgba',
+            bufferfmt='ubyte'
+        )
+        self.canvas.ask_update()
@@ -0,0 +1,131 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+
+class DelayController(object):
+    """
+    Closed-loop controller for the send delay of a session's back-end.
+    Watches how far the session lags behind its incoming frames and sends
+    change_delay messages so that the send rate follows what the front-end
+    can render. Every session has a controller of its own, so a slow
+    back-end only slows down itself.
+    """
+
+    def __init__(self, manyman):
+        self.manyman = manyman
+        self.enabled = False
+        self.delay = None
+
+        self._frames = 0
+        self._frame_lag = 0.0
+        self._dropped = 0
+
+    def get_bounds(self):
+        """Retrieve the minimum and maximum delay the controller may set."""
+        return (
+            self.manyman.settings['auto_delay_min'],
+            self.manyman.settings['auto_delay_max']
+        )
+
+    def start(self):
+        """Start controlling the send delay."""
+        if self.enabled:
+            return
+
+        Logger.info("DelayController: Automatic send delay enabled")
+        self.enabled = True
+        self.delay = None
+        self.mark()
+        Clock.schedule_interval(
+            self.update,
+            self.manyman.settings['auto_delay_interval']
+        )
+
+    def stop(self):
+        """Stop controlling the send delay."""
+        if not self.enabled:
+            return
+
+        Logger.info("DelayController: Automatic send delay disabled")
+        self.enabled = False
+        Clock.unschedule(self.update)
+
+    def toggle(self):
+        """Toggle the controller on or off."""
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+
+    def override(self, delay):
+        """
+        Handler when the user sets the delay by hand. The manual value takes
+        precedence, so the controller is switched off.
+        """
+        self.stop()
+        self.delay = delay
+
+    def update(self, *largs):
+        """Determine the new send delay from the front-end lag."""
+        settings = self.manyman.settings
+        counters = self.manyman.counters
+        frames = counters.frames - self._frames
+        lag = (counters.frame_lag - self._frame_lag) / max(1, frames)
+        dropped = counters.dropped_frames - self._dropped
+        self.mark()
+
+        if self.delay is None:
+            # Start from the delay the back-end reports
+            self.delay = self.manyman.current_delay
+            if self.delay is None:
+                return
+
+        dmin, dmax = self.get_bounds()
+        delay = self.delay
+        if lag > settings['auto_delay_target_lag'] or dropped > 0 or \
+            counters.queue_depth > settings['auto_delay_max_queue']:
+            # The front-end can not keep up; back off quickly
+            delay *= settings['auto_delay_increase']
+        elif frames > 0 and lag < settings['auto_delay_target_lag'] / 2.:
+            # There is room to spare; speed up slowly
+            delay *= settings['auto_delay_decrease']
+        delay = min(dmax, max(dmin, delay))
+
+        if abs(delay - self.delay) < 1e-3 * self.delay:
+            return
+
+        Logger.debug(
+            "DelayController: Lag %.1f ms, queue %d, dropped %d; "
+            "delay %.3f -> %.3f" %
+            (lag * 1000., counters.queue_depth, dropped, self.delay, delay)
+        )
+        self.delay = delay
+        if self.manyman.comm:
+            self.manyman.comm.change_delay(delay)
+
+    def mark(self):
+        """Remember the counter values the next update is relative to."""
+        counters = self.manyman.counters
+        self._frames = counters.frames
+        self._frame_lag = counters.frame_lag
+        self._dropped = counters.dropped_frames
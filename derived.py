@@ -0,0 +1,277 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from kivy.logger import Logger
+import ast
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Numbers and var references in an expression. Var references may contain
+# a single '*', which matches an instance, such as the core of 'cpu*:ipc'. A
+# wildcard is next to a ':' or '.'; any other '*' is a multiplication, as in
+# 'cpu0:x*2'.
+token_re = re.compile(
+    r'\d+\.?\d*(?:[eE][-+]?\d+)?|'
+    r'[A-Za-z_](?:[\w.:]|\*(?=[.:])|(?<=[.:])\*)*'
+)
+
+functions = ('abs',)
+
+binary_operators = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Pow: '**'
+}
+
+unary_operators = {
+    ast.USub: '-',
+    ast.UAdd: '+'
+}
+
+# The component of derived vars that do not name a component themselves
+derived_component = 'derived'
+
+
+if numpy is not None:
+    def safe_div(a, b):
+        """Divide, yielding 0 where the divisor is 0."""
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            q = numpy.true_divide(a, b)
+        return numpy.where(b != 0, q, 0.)
+else:
+    def safe_div(a, b):
+        """Divide, yielding 0 where the divisor is 0."""
+        if not b:
+            return 0.
+        return a / float(b)
+
+
+def parse(expression):
+    """
+    Parse an expression over var names. Returns the syntax tree, in which
+    every var reference is a placeholder name, and the list of references.
+    """
+    refs = []
+
+    def placeholder(match):
+        token = match.group(0)
+        if token[0].isdigit() or token in functions:
+            return token
+        refs.append(token)
+        return "_r%d" % (len(refs) - 1)
+
+    tree = ast.parse(token_re.sub(placeholder, expression), mode='eval')
+    render(tree, dict(("_r%d" % i, '0') for i in range(len(refs))))
+    return tree, refs
+
+
+def render(node, refs):
+    """
+    Render the syntax tree of an expression as Python source, replacing the
+    placeholders by the given sources. Divisions become safe divisions.
+    Raises ValueError for anything but arithmetic.
+    """
+    if isinstance(node, ast.Expression):
+        return render(node.body, refs)
+    if isinstance(node, ast.BinOp):
+        left = render(node.left, refs)
+        right = render(node.right, refs)
+        if isinstance(node.op, ast.Div):
+            return "_div(%s, %s)" % (left, right)
+        if type(node.op) in binary_operators:
+            return "(%s %s %s)" % (left, binary_operators[type(node.op)], right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in unary_operators:
+        return "(%s%s)" % (
+            unary_operators[type(node.op)],
+            render(node.operand, refs)
+        )
+    if isinstance(node, ast.Num):
+        return repr(float(node.n))
+    if isinstance(node, ast.Name) and node.id in refs:
+        return refs[node.id]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+        node.func.id in functions and len(node.args) == 1 and \
+        not node.keywords:
+        return "%s(%s)" % (node.func.id, render(node.args[0], refs))
+    raise ValueError('Unsupported expression: %s' % ast.dump(node))
+
+
+def wildcard_re(ref):
+    """Determine the regular expression matching the instances of a ref."""
+    return re.compile('^%s$' % re.escape(ref).replace(r'\*', '(.+?)'))
+
+
+def output_name(name, instance):
+    """Determine the full var name of a derived var."""
+    if instance is not None:
+        name = name.replace('*', instance)
+    if not ':' in name:
+        name = "%s:%s" % (derived_component, name)
+    return name
+
+
+class Metric(object):
+    """A single derived metric, expanded over the instances it matches."""
+
+    def __init__(self, name, expression, sample_vars):
+        self.name = name
+        self.tree, self.refs = parse(expression)
+        self.wildcards = [ref for ref in self.refs if '*' in ref]
+        if self.wildcards and not '*' in name:
+            # Every instance would get the same name
+            raise ValueError(
+                "Name has no '*' for the instances of %s" %
+                ', '.join(self.wildcards)
+            )
+
+        # The instances are the ones all wildcard references match
+        self.instances = [None]
+        if self.wildcards:
+            matches = None
+            for ref in self.wildcards:
+                pattern = wildcard_re(ref)
+                found = set()
+                for var in sample_vars:
+                    match = pattern.match(var)
+                    if match:
+                        found.add(match.group(1))
+                matches = found if matches is None else matches & found
+            self.instances = sorted(matches)
+
+        self.names = [output_name(name, i) for i in self.instances]
+
+    def resolve(self, ref, instance):
+        """Determine the var a reference refers to for the given instance."""
+        if instance is None:
+            return ref
+        return ref.replace('*', instance)
+
+    def source(self, columns, arrays):
+        """
+        Render this metric as Python source over the frame array 'v', given
+        the column of every var. Vectorized over the instances when numpy is
+        available; the index arrays used are appended to 'arrays'.
+        """
+        def column(ref, instance):
+            return columns.get(self.resolve(ref, instance))
+
+        if not self.instances:
+            # The wildcards match nothing in this selection
+            return []
+
+        if numpy is not None and self.wildcards:
+            refs = dict()
+            for i, ref in enumerate(self.refs):
+                indices = [column(ref, inst) for inst in self.instances]
+                if None in indices:
+                    refs["_r%d" % i] = '0.'
+                elif not '*' in ref:
+                    refs["_r%d" % i] = "v[%d]" % indices[0]
+                else:
+                    refs["_r%d" % i] = "v[_ix%d]" % len(arrays)
+                    arrays.append(numpy.array(indices, dtype=int))
+            return [render(self.tree, refs)]
+
+        sources = []
+        for inst in self.instances:
+            refs = dict()
+            for i, ref in enumerate(self.refs):
+                c = column(ref, inst)
+                refs["_r%d" % i] = '0.' if c is None else "v[%d]" % c
+            sources.append(render(self.tree, refs))
+        return sources
+
+
+class DerivedMetrics(object):
+    """
+    Metrics derived from the sampled vars, defined by expressions over var
+    names such as 'cpu0:pipeline.retired / kernel.cycle'. A '*' in a var
+    name matches all instances, as in 'cpu*:ipc', which yields a var per
+    matched core; the name of such a metric needs a '*' as well, which is
+    replaced by the instance. Metrics that do not name a component end up
+    in the 'derived' component.
+
+    The expressions are parsed once per selection, and compiled into a
+    single function over the frame's value array whenever the layout of
+    the frames changes, so evaluating a frame costs one function call.
+    """
+
+    def __init__(self, metrics, sample_vars):
+        self.metrics = []
+        self.names = []
+        for name in sorted(metrics.keys()):
+            try:
+                metric = Metric(name, metrics[name], sample_vars)
+            except (SyntaxError, ValueError), e:
+                Logger.error("DerivedMetrics: Invalid metric %s: %s" %
+                    (name, e))
+                continue
+            if not metric.instances:
+                Logger.warning("DerivedMetrics: Metric %s matches no vars" %
+                    name)
+            self.metrics.append(metric)
+            self.names.extend(metric.names)
+
+        self.frame_names = None
+        self.all_names = None
+        self.function = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def bind(self, names):
+        """Compile the metrics for frames with vars in the given order."""
+        self.frame_names = names
+        self.all_names = list(names) + self.names
+
+        columns = dict((name, i) for i, name in enumerate(names))
+        arrays = []
+        sources = []
+        for metric in self.metrics:
+            sources.extend(metric.source(columns, arrays))
+
+        namespace = {'_div': safe_div}
+        for i, indices in enumerate(arrays):
+            namespace["_ix%d" % i] = indices
+        self.function = eval(
+            "lambda v: (%s,)" % ', '.join(sources),
+            namespace
+        )
+
+    def extend(self, names, values):
+        """
+        Evaluate the metrics on a frame. Returns the names and values of the
+        frame, with the derived vars appended.
+        """
+        if names != self.frame_names:
+            self.bind(names)
+
+        if numpy is not None:
+            values = numpy.asarray(values, dtype=float)
+            derived = numpy.hstack(self.function(values))
+            return self.all_names, numpy.concatenate((values, derived))
+
+        return self.all_names, list(values) + list(self.function(values))
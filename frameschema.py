@@ -0,0 +1,183 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from numbers import Real
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def split_var(name):
+    """Split a sampled var name into its component and the var within it."""
+    components = name.split(':')
+    if len(components) < 2:
+        return components[0], components[0]
+    return components[0], ':'.join(components[1:])
+
+
+def join_var(component, var):
+    """Determine the full name of a var within a component."""
+    if var == component:
+        return var
+    return "%s:%s" % (component, var)
+
+
+class FrameSchema(object):
+    """
+    Fixed order of the sampled vars within a frame. Each frame's values are
+    gathered into one array in this order, so that the deltas, rates and
+    changed flags of all vars are computed in a single array operation. The
+    vars of a component are contiguous, so every component receives its
+    results as one slice.
+
+    Values are kept as floats; next to them, every var keeps whether all of
+    its values so far were whole numbers, so integer counters can still be
+    shown as such. Non-numeric values, such as strings, are left out.
+
+    Uses numpy when available, and plain lists otherwise.
+    """
+
+    def __init__(self, names):
+        self.vars = []
+        self.columns = dict()
+        self.components = []
+
+        keys = sorted(set(split_var(name) for name in names))
+        for component, var in keys:
+            if not self.components or self.components[-1][0] != component:
+                self.components.append([component, len(self.vars), 0])
+            self.columns[(component, var)] = len(self.vars)
+            self.vars.append(var)
+            self.components[-1][2] = len(self.vars)
+
+        self.names = None
+        self.take = None
+        self.values = None
+        self.integral = None
+
+    def __len__(self):
+        return len(self.vars)
+
+    def full_names(self):
+        """Retrieve the full names of the vars, in schema order."""
+        names = []
+        for component, start, end in self.components:
+            for var in self.vars[start:end]:
+                names.append(join_var(component, var))
+        return names
+
+    def numeric(self, names, values):
+        """
+        Leave the vars with a non-numeric value out of a frame. Returns the
+        names and values of the numeric vars.
+        """
+        if numpy is not None:
+            incoming = numpy.asarray(values)
+            if incoming.dtype.kind in 'biuf':
+                return names, incoming
+        elif all(isinstance(v, Real) for v in values):
+            return names, values
+
+        keep = [i for i, v in enumerate(values) if isinstance(v, Real)]
+        names = [names[i] for i in keep]
+        values = [values[i] for i in keep]
+        if numpy is not None:
+            values = numpy.array(values, dtype=float)
+        return names, values
+
+    def gather(self, names, values):
+        """
+        Gather the values of a frame, given in the order of 'names', into an
+        array in schema order. Vars missing from the frame, or of which the
+        value is not a number, keep their previous value.
+        """
+        names, values = self.numeric(names, values)
+        if names != self.names:
+            # The layout of the frames changed; determine which frame value
+            # goes into which column
+            self.names = names
+            self.take = []
+            for i, name in enumerate(names):
+                column = self.columns.get(split_var(name))
+                if column is not None:
+                    self.take.append((i, column))
+            if numpy is not None:
+                self.take = numpy.array(self.take, dtype=int).reshape(-1, 2)
+
+        if self.integral is None:
+            self.integral = [True] * len(self.vars)
+            if numpy is not None:
+                self.integral = numpy.array(self.integral, dtype=bool)
+
+        if numpy is not None:
+            incoming = numpy.asarray(values, dtype=float)[self.take[:, 0]]
+            if self.values is None:
+                out = numpy.zeros(len(self.vars))
+            else:
+                out = self.values.copy()
+            out[self.take[:, 1]] = incoming
+            self.integral[self.take[:, 1]] &= incoming == numpy.floor(incoming)
+        else:
+            if self.values is None:
+                out = [0.0] * len(self.vars)
+            else:
+                out = list(self.values)
+            for i, column in self.take:
+                value = float(values[i])
+                out[column] = value
+                if not value.is_integer():
+                    self.integral[column] = False
+
+        return out
+
+    def store(self, names, values):
+        """
+        Gather a frame and keep its values as the previous ones, without
+        determining rates. Returns the values in schema order.
+        """
+        self.values = self.gather(names, values)
+        return self.values
+
+    def update(self, names, values, cycles):
+        """
+        Process a frame that spans the given number of kernel cycles.
+        Returns the values, the rates and the changed flags of all vars in
+        schema order.
+        """
+        previous = self.values
+        current = self.store(names, values)
+        if previous is None:
+            previous = current
+
+        if numpy is not None:
+            delta = current - previous
+            if cycles != 0:
+                rates = delta / float(cycles)
+            else:
+                rates = numpy.zeros(len(delta))
+            return current, rates, delta != 0
+
+        delta = [c - p for c, p in zip(current, previous)]
+        if cycles != 0:
+            rates = [d / float(cycles) for d in delta]
+        else:
+            rates = [0.0] * len(delta)
+        return current, rates, [d != 0 for d in delta]
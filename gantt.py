@@ -0,0 +1,287 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from colorsys import hsv_to_rgb
+from kivy.graphics import Color, Mesh
+from kivy.graphics.texture import Texture
+from kivy.uix.label import Label
+from kivy.uix.widget import Widget
+from time import time
+
+# Number of distinct core colours of the chart
+palette_size = 64
+
+
+class PlacementStore(object):
+    """
+    History of the placement of tasks on cores, as intervals of a task on a
+    core in a state (running or stopped). An interval is only appended when a
+    task changes core or state; intervals are kept in order of their start,
+    in flat arrays, with the end of the open intervals at infinity. Times are
+    seconds since the store was created, as status messages carry no cycle.
+    """
+
+    def __init__(self):
+        self.start_time = time()
+
+        self.starts = array('d')
+        self.ends = array('d')
+        self.rows = array('l')
+        self.cores = array('l')
+        self.stopped = array('b')
+
+        # Every task gets a row, in order of appearance
+        self.tasks = []
+        self.names = []
+        self.task_rows = dict()
+
+        # Index of the open interval of every placed task
+        self.open = dict()
+
+        # Length of the longest closed interval, for culling
+        self.max_length = 0.
+
+    def __len__(self):
+        return len(self.starts)
+
+    def now(self):
+        """Retrieve the current time of the store."""
+        return time() - self.start_time
+
+    def record(self, tid, name, core, status):
+        """Record the state of a task in a status update."""
+        placed = core >= 0 and not status in ["Finished", "Failed"]
+        stopped = status == "Stopped"
+
+        i = self.open.get(tid)
+        if i is not None:
+            if placed and self.cores[i] == core and \
+                self.stopped[i] == stopped:
+                return
+            self.close(tid)
+
+        if not placed:
+            return
+
+        if not tid in self.task_rows:
+            self.task_rows[tid] = len(self.tasks)
+            self.tasks.append(tid)
+            self.names.append(name)
+
+        self.open[tid] = len(self.starts)
+        self.starts.append(self.now())
+        self.ends.append(float('inf'))
+        self.rows.append(self.task_rows[tid])
+        self.cores.append(core)
+        self.stopped.append(stopped)
+
+    def close(self, tid):
+        """Close the open interval of the given task, if any."""
+        i = self.open.pop(tid, None)
+        if i is None:
+            return
+
+        self.ends[i] = self.now()
+        self.max_length = max(self.max_length, self.ends[i] - self.starts[i])
+
+    def visible(self, t0, t1, r0, r1):
+        """
+        Determine the intervals that overlap the time range [t0, t1] in the
+        rows [r0, r1). The starts are sorted, so only the intervals starting
+        between t0 minus the longest closed interval and t1 are checked,
+        together with the open intervals.
+        """
+        lo = bisect_left(self.starts, t0 - self.max_length)
+        hi = bisect_right(self.starts, t1)
+        result = [i for i in xrange(lo, hi) \
+            if self.ends[i] >= t0 and r0 <= self.rows[i] < r1]
+        for i in self.open.values():
+            if i < lo and r0 <= self.rows[i] < r1:
+                result.append(i)
+        return result
+
+    def find(self, t, row):
+        """Determine the interval in the given row at time t, if any."""
+        for i in self.visible(t, t, row, row + 1):
+            if self.starts[i] <= t <= self.ends[i]:
+                return i
+        return None
+
+
+def palette():
+    """
+    Create the texture with the interval colours: a column per core colour,
+    with the colour of running tasks in the bottom row and the dimmed colour
+    of stopped tasks in the top row.
+    """
+    pixels = array('B')
+    for value in (1., .4):
+        for i in xrange(palette_size):
+            # Spread the hues of neighbouring cores
+            r, g, b = hsv_to_rgb((i * .618034) % 1, .8, value)
+            pixels.extend((int(r * 255), int(g * 255), int(b * 255), 255))
+
+    texture = Texture.create(size=(palette_size, 2), colorfmt='rgba')
+    texture.mag_filter = 'nearest'
+    texture.blit_buffer(pixels.tostring(), colorfmt='rgba', bufferfmt='ubyte')
+    return texture
+
+
+class GanttChart(Widget):
+    """
+    Gantt chart of the task placement: a row per task, with the intervals
+    coloured by core. The visible intervals are drawn as a single mesh that
+    is only rebuilt for the intervals within the viewport. Dragging scrolls
+    through time and tasks, a double tap returns to following the present
+    and a tap shows the touched interval.
+    """
+
+    def __init__(self, manyman, **kwargs):
+        self.manyman = manyman
+        self.store = manyman.placements
+        self.span = manyman.settings['gantt_span']
+        self.row_height = manyman.settings['gantt_row_height']
+
+        # Viewport: the time at the right edge, or None to follow the
+        # present, and the first visible row
+        self.t_end = None
+        self.first_row = 0
+
+        self.info = Label(
+            text='',
+            halign='left',
+            valign='top',
+            size_hint=(None, None)
+        )
+
+        super(GanttChart, self).__init__(**kwargs)
+
+        self.texture = palette()
+        with self.canvas:
+            Color(1, 1, 1)
+            self.mesh = Mesh(
+                vertices=[],
+                indices=[],
+                mode='triangles',
+                texture=self.texture
+            )
+
+        self.add_widget(self.info)
+        self.bind(pos=self.update, size=self.update)
+
+    def viewport(self):
+        """Determine the visible time range and rows."""
+        t1 = self.t_end
+        if t1 is None:
+            t1 = self.store.now()
+        rows = int(self.height / self.row_height) + 1
+        return t1 - self.span, t1, self.first_row, self.first_row + rows
+
+    def update(self, *largs):
+        """Rebuild the mesh of the visible intervals."""
+        store = self.store
+        t0, t1, r0, r1 = self.viewport()
+        now = store.now()
+        scale = self.width / self.span
+
+        vertices = []
+        indices = []
+        for n, i in enumerate(store.visible(t0, t1, r0, r1)):
+            x0 = self.x + (max(store.starts[i], t0) - t0) * scale
+            x1 = self.x + (min(store.ends[i], now, t1) - t0) * scale
+            y1 = self.top - (store.rows[i] - r0) * self.row_height
+            y0 = y1 - self.row_height + 1
+            u = (store.cores[i] % palette_size + .5) / palette_size
+            v = .75 if store.stopped[i] else .25
+            vertices.extend((
+                x0, y0, u, v,
+                x1, y0, u, v,
+                x1, y1, u, v,
+                x0, y1, u, v
+            ))
+            k = 4 * n
+            indices.extend((k, k + 1, k + 2, k, k + 2, k + 3))
+
+        self.mesh.vertices = vertices
+        self.mesh.indices = indices
+        self.info.pos = (self.x + 5, self.top - self.info.height - 5)
+
+    def on_touch_down(self, touch):
+        """Handler when the chart is touched."""
+        if not self.collide_point(touch.x, touch.y):
+            return super(GanttChart, self).on_touch_down(touch)
+
+        if touch.is_double_tap:
+            # Follow the present again
+            self.t_end = None
+            self.first_row = 0
+            self.info.text = ''
+            self.update()
+            return True
+
+        touch.grab(self)
+        t0, t1, r0, r1 = self.viewport()
+        t = t0 + (touch.x - self.x) / self.width * self.span
+        row = r0 + int((self.top - touch.y) / self.row_height)
+        i = self.store.find(t, row)
+        if i is None:
+            self.info.text = ''
+        else:
+            end = self.store.ends[i]
+            self.info.text = "%s on core %d: %.1fs - %s" % (
+                self.store.names[row],
+                self.store.cores[i],
+                self.store.starts[i],
+                "now" if end == float('inf') else "%.1fs" % end
+            )
+        self.info.texture_update()
+        self.info.size = self.info.texture_size
+        return True
+
+    def on_touch_move(self, touch):
+        """Handler when a touch is dragged. Scrolls the chart."""
+        if touch.grab_current is not self:
+            return super(GanttChart, self).on_touch_move(touch)
+
+        if self.t_end is None:
+            self.t_end = self.store.now()
+        self.t_end = min(
+            self.store.now(),
+            self.t_end - touch.dx / self.width * self.span
+        )
+        self.first_row = max(
+            0,
+            min(
+                len(self.store.tasks) - 1,
+                self.first_row + int(round(touch.dy / self.row_height))
+            )
+        )
+        self.update()
+        return True
+
+    def on_touch_up(self, touch):
+        """Handler when a touch is released."""
+        if touch.grab_current is not self:
+            return super(GanttChart, self).on_touch_up(touch)
+
+        touch.ungrab(self)
+        return True
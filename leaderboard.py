@@ -0,0 +1,149 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from heapq import heappop, heappush
+from kivy.clock import Clock
+from kivy.uix.button import Button
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+
+
+class Leaderboard(object):
+    """
+    Tournament tree over the scores of a fixed set of keys. Every internal
+    node holds the leaf with the highest score below it, so updating a score
+    replays only the matches on its path to the root, and the top K keys are
+    found by a best-first walk from the root without sorting all scores.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.slots = dict((k, i) for i, k in enumerate(self.keys))
+        self.scores = [float('-inf')] * len(self.keys)
+
+        self.size = 1
+        while self.size < len(self.keys):
+            self.size *= 2
+
+        # Leaf index of the winner of every subtree, -1 for empty subtrees
+        self.tree = [-1] * (2 * self.size)
+        for i in range(len(self.keys)):
+            self.tree[self.size + i] = i
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = self.winner(node)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def winner(self, node):
+        """Determine the winner of the match between the node's children."""
+        left = self.tree[2 * node]
+        right = self.tree[2 * node + 1]
+        if right < 0 or (left >= 0 and self.scores[left] >= self.scores[right]):
+            return left
+        return right
+
+    def update(self, key, score):
+        """Set the score of the given key."""
+        i = self.slots.get(key)
+        if i is None or self.scores[i] == score:
+            return
+
+        self.scores[i] = score
+        node = (self.size + i) // 2
+        while node:
+            self.tree[node] = self.winner(node)
+            node //= 2
+
+    def top(self, k):
+        """Retrieve the k keys with the highest scores, with their scores."""
+        result = []
+        if not self.keys:
+            return result
+
+        heap = [(-self.scores[self.tree[1]], 1)]
+        while heap and len(result) < k:
+            score, node = heappop(heap)
+            if score == float('inf'):
+                # Only keys without a score remain
+                break
+            if node >= self.size:
+                result.append((self.keys[self.tree[node]], -score))
+                continue
+            for child in (2 * node, 2 * node + 1):
+                leaf = self.tree[child]
+                if leaf >= 0:
+                    heappush(heap, (-self.scores[leaf], child))
+        return result
+
+
+class LeaderboardPanel(GridLayout):
+    """Panel listing the most active components."""
+
+    def __init__(self, manyman, **kwargs):
+        self.manyman = manyman
+        self.buttons = []
+
+        settings = {
+            'cols': 1,
+            'spacing': 5,
+            'size_hint_y': None
+        }
+        settings.update(kwargs)
+
+        super(LeaderboardPanel, self).__init__(**settings)
+        self.bind(minimum_height=self.setter('height'))
+
+        self.add_widget(Label(
+            text="Most active:",
+            size_hint_y=None,
+            height=20
+        ))
+        for i in range(manyman.settings['leaderboard_size']):
+            button = Button(text='', size_hint_y=None, height=30)
+            button.component = None
+            button.bind(on_press=self.open_component)
+            self.buttons.append(button)
+            self.add_widget(button)
+
+        Clock.schedule_interval(
+            self.update,
+            manyman.settings['leaderboard_interval']
+        )
+
+    def update(self, *largs):
+        """Show the current top components."""
+        mm = self.manyman
+        entries = []
+        if mm.leaderboard:
+            entries = mm.leaderboard.top(len(self.buttons))
+
+        for i, button in enumerate(self.buttons):
+            if i < len(entries):
+                button.component, score = entries[i]
+                button.text = "%s: %.3f" % (button.component, score)
+            else:
+                button.component = None
+                button.text = ''
+
+    def open_component(self, button):
+        """Open the popup of the component of the given entry."""
+        if button.component in self.manyman.components_list:
+            self.manyman.components_list[button.component].info.show()
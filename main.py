@@ -18,11 +18,14 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from archive import ArchiveReader, ArchiveWriter
+from archiveplayer import ArchivePlayer
 from communicator import Communicator
-from component import Component
+from correlation import CorrelationView, SlidingCorrelation
 from valueslider import ValueSlider
 from infopopup import InfoPopup
 from kivy.app import App
+from leaderboard import Leaderboard, LeaderboardPanel
 from kivy.clock import Clock
 from kivy.config import Config
 from kivy.logger import Logger, LOG_LEVELS
@@ -36,21 +39,28 @@ from kivy.uix.label import Label
 from kivy.uix.popup import Popup
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.widget import WidgetException
+from outputwriter import OutputWriter
 from os import _exit as exit
-from os.path import exists
+from os.path import exists, join
 from perfgraph import PerfGraph
+from perfstats import PerfOverlay
+from simulator import Session, Simulator
+from raster import ActivityRaster
 from task import CoreTask, PendingTask
-from time import sleep
-from util import is_prime
+from time import sleep, strftime
 from widgets import MyTextInput, MyVKeyboard
 from kivy.uix.textinput import TextInput
-from dotdictify import dotdictify
+from gantt import GanttChart
+from codec import select_codec
+from multiprocessing import Pool
 import config
 import kivy
 import sys
 import task
 import math
 import json
+import re
+import transport
 
 default_settings = {
     'kivy_version': '1.2.0',
@@ -59,6 +69,34 @@ default_settings = {
     'address': ['sccsa.science.uva.nl', 11111],
     'framerate': 60.,
     'bufsize': 1024,
+    'json_codec': 'auto',
+    'record_messages': '',
+    'decode_workers': 0,
+    'connect_timeout': 10.0,
+    'apply_budget': 0.01,
+    'max_pending_frames': 20,
+    'archive': '',
+    'archive_chunk_rows': 4096,
+    'archive_flush_interval': 5.0,
+    'open_archive': '',
+    'archive_playback_delay': 0.1,
+    'derived_metrics': {},
+    'alert_rules': [],
+    'alert_budget': 0.002,
+    'alert_chunk_size': 256,
+    'leaderboard_size': 8,
+    'leaderboard_interval': 0.5,
+    'leaderboard_measure': 'activity',
+    'correlation_vars': [],
+    'correlation_window': 100,
+    'correlation_interval': 0.5,
+    'raster_width': 512,
+    'simulators': [],
+    'relay_listen': [],
+    'relay_max_queue': 1000,
+    'gantt_span': 60.0,
+    'gantt_row_height': 12,
+    'gantt_interval': 0.5,
     'core_background': 'img/core.png',
     'core_background_active': 'img/core_active.png',
     'core_border': [14, 14, 14, 14],
@@ -77,9 +115,27 @@ default_settings = {
     'about_image': 'img/about.png',
     'license_image': 'img/license.png',
     'output_buffer_size': 100,
+    'output_ring_size': 1000,
+    'output_page_size': 50,
     'output_to_file': True,
     'output_folder': 'output',
+    'output_push_window': 65536,
+    'output_max_open_files': 64,
+    'output_flush_interval': 1.0,
+    'output_flush_size': 65536,
     'perfgraph_default_history': '50',
+    'timeseries_capacity': '4096',
+    'cycle_history_capacity': 4096,
+    'perf_overlay': False,
+    'perf_overlay_interval': 1.0,
+    'auto_delay': False,
+    'auto_delay_min': 0.1,
+    'auto_delay_max': 10.0,
+    'auto_delay_interval': 1.0,
+    'auto_delay_target_lag': 0.05,
+    'auto_delay_max_queue': 10,
+    'auto_delay_increase': 1.5,
+    'auto_delay_decrease': 0.9,
     'voltage_islands': [
         [0, 1, 2, 3, 12, 13, 14, 15],
         [4, 5, 6, 7, 16, 17, 18, 19],
@@ -91,7 +147,7 @@ default_settings = {
 }
 
 
-class ManyMan(App):
+class ManyMan(App, Session):
     """
     Application window. Contains all visualization and sets up the entire
     front-end system.
@@ -103,36 +159,43 @@ class ManyMan(App):
             self.settings_file = sys.argv[1]
 
         self.settings = default_settings.copy()
-        self.comm = None
-        self.cores = dict()
-        self.tasks = dict()
+        self.app = self
+        self.simulators = []
+        self.grids = None
+        self.diff_view = False
+        self.diff_button = None
+        self.output_writer = None
+        self.archive_writer = None
+        self.archive_player = None
+        self.archive_folder = None
+        self.archive_segment = 0
+        self.codec = None
+        self.decode_pool = None
         self.pending_tasks = dict()
         self.pending_count = 0
         self.finished_tasks = dict()
-        self.chip_name = ""
-        self.chip_cores = ""
-        self.chip_orientation = None
+        self.selected_tasks = dict()
         self.started = False
 
         # EDITED
         self.selections_file = 'selections.txt'
-        self.core_grid = None
-        self.sample_vars = []
-        self.current_vars = []
-        self.current_vars2 = []
         self.components = dict()
-        self.l1_components_grid_list = dict()
-        self.components_list = dict()
         self.vars_input = None
         self.change_selection = None
         self.saved_selection_list = None
-        self.current_kernel_cycle = 0
-        self.previous_kernel_cycle = 0
-
-        self.status_label = None
-        self.kernel_label = None
-        self.delay_label = None
-        self.step_label = None
+        self.leaderboard = None
+        self.correlation = None
+        self.correlation_vars = []
+        self.correlation_window = None
+        self.correlation_view = None
+        self.correlation_legend = None
+        self.activity_raster = None
+        self.raster_window = None
+        self.gantt_window = None
+        self.gantt_chart = None
+        self.auto_delay_button = None
+
+        self.perf_overlay = None
 
         self.save_selection_popup = None
         self.save_selection_name = None
@@ -144,6 +207,9 @@ class ManyMan(App):
         self.step_input = None
         self.set_step_popup = None
 
+        self.seek_input = None
+        self.seek_popup = None
+
         self.layout = None
         self.sidebar = None
         self.leftbar = None
@@ -162,9 +228,20 @@ class ManyMan(App):
 
         self.load_settings()
         self.load_selections()
+        self.init_session(
+            transport.describe(self.settings['address']),
+            self.settings['address']
+        )
+        self.correlation_vars = list(self.settings['correlation_vars'])
         self.config_kivy()
         self.config_logger()
-        self.init_communicator()
+        self.init_output_writer()
+        if self.settings['open_archive']:
+            self.init_archive_player()
+        else:
+            self.init_decoding()
+            self.init_communicator()
+            self.init_simulators()
 
         super(ManyMan, self).__init__(**kwargs)
 
@@ -208,6 +285,27 @@ class ManyMan(App):
         """Configure the kivy logger."""
         Logger.setLevel(LOG_LEVELS[self.settings['logging_level']])
 
+    def init_output_writer(self):
+        """Initialize the writer for the task output files."""
+        self.output_writer = OutputWriter(
+            self.settings['output_folder'],
+            self.settings['output_max_open_files'],
+            self.settings['output_flush_interval'],
+            self.settings['output_flush_size']
+        )
+        self.output_writer.start()
+
+    def init_decoding(self):
+        """
+        Select the JSON codec and start the decode workers, if any. They are
+        shared by the communicators of all back-ends.
+        """
+        self.codec = select_codec(self.settings['json_codec'])
+        Logger.info("ManyMan: Using the %s JSON codec" % self.codec.name)
+
+        if self.settings['decode_workers'] > 0:
+            self.decode_pool = Pool(self.settings['decode_workers'])
+
     def init_communicator(self):
         """Initialize the communicator."""
         try:
@@ -221,6 +319,86 @@ class ManyMan(App):
                 self.comm.join()
             exit(0)
 
+    def init_simulators(self):
+        """Connect to the additional back-ends, if any."""
+        for name, address in self.settings['simulators']:
+            simulator = Simulator(self, name, address)
+            simulator.connect()
+            self.simulators.append(simulator)
+
+    def sessions(self):
+        """Retrieve the primary session followed by the additional ones."""
+        return [self] + self.simulators
+
+    def backends(self):
+        """
+        Retrieve the back-ends the controls of the window go to: the
+        communicators of all sessions, or the archive player when browsing
+        an archive.
+        """
+        return [s.backend for s in self.sessions() if s.backend]
+
+    def init_archive_player(self):
+        """
+        Open the archive to browse instead of connecting to the back-end.
+        The selection of vars is the one the archive was recorded with.
+        """
+        try:
+            reader = ArchiveReader(self.settings['open_archive'])
+        except Exception, err:
+            print 'Archive could not be opened: %s' % err
+            exit(1)
+
+        self.archive_player = ArchivePlayer(self, reader)
+        self.chip_name = reader.chip_name
+        self.sample_vars = reader.names
+        self.current_vars = reader.names
+        Logger.info("ManyMan: Browsing archive %s with %d frames" %
+            (self.settings['open_archive'], len(reader)))
+
+    def init_archive_writer(self):
+        """
+        Start a new archive segment for the current selection of vars, if
+        archiving is enabled. Every selection gets its own segment, as the
+        columns of an archive are fixed.
+        """
+        if self.archive_writer:
+            self.archive_writer.close()
+            self.archive_writer = None
+
+        if not self.settings['archive'] or self.archive_player:
+            return
+
+        if not self.archive_folder:
+            self.archive_folder = join(
+                self.settings['archive'],
+                strftime('%Y%m%d-%H%M%S')
+            )
+
+        folder = join(self.archive_folder, "%03d" % self.archive_segment)
+        self.archive_segment += 1
+        self.archive_writer = ArchiveWriter(
+            folder,
+            self.frame_schema.full_names(),
+            self.chip_name,
+            self.settings['archive_chunk_rows']
+        )
+        Logger.info("ManyMan: Archiving the sampled vars to %s" % folder)
+
+        Clock.unschedule(self.flush_archive)
+        Clock.schedule_interval(
+            self.flush_archive,
+            self.settings['archive_flush_interval']
+        )
+
+    def flush_archive(self, dt):
+        """
+        Periodically store the archived frames and their number, so a crash
+        loses at most the frames of one interval.
+        """
+        if self.archive_writer:
+            self.archive_writer.flush()
+
     def build_config(self, *largs):
         """Copy the settings to the Kivy Config module."""
         Config.setdefaults('settings', self.settings)
@@ -235,20 +413,42 @@ class ManyMan(App):
         """Handler when the tool is started."""
         self.set_vkeyboard()
         self.init_leftbar()
+        self.grids = BoxLayout(spacing=10)
+        self.layout.add_widget(self.grids)
         self.init_core_grid()
         self.init_rightbar()
         self.init_new_selection()
         self.init_change_delay()
         self.init_set_step()
+        if self.archive_player:
+            self.init_seek()
         self.init_save_selection_popup()
         self.started = True
 
+        # Back-ends that are initialized later build their grid themselves
+        for simulator in self.simulators:
+            simulator.init_core_grid()
+
+        if self.archive_player:
+            self.archive_player.start()
+
     def on_stop(self):
         """Handler when the tool is stopped."""
         #self.comm.sock.shutdown(0)
-        self.comm.sock.close()
-        self.comm.running = False
-        self.comm.join()
+        for session in self.sessions():
+            session.delay_controller.stop()
+        if self.comm:
+            self.comm.close()
+            self.comm.join()
+        for simulator in self.simulators:
+            simulator.close()
+        if self.decode_pool:
+            self.decode_pool.terminate()
+        if self.archive_player:
+            self.archive_player.close()
+        if self.archive_writer:
+            self.archive_writer.close()
+        self.output_writer.stop()
 
     def set_vkeyboard(self):
         """Setup the virtual keyboard."""
@@ -273,114 +473,27 @@ class ManyMan(App):
         #EDITED!
         self.init_saved_selection()
         self.init_save_current_selection()
+        self.init_leaderboard()
 
         self.layout.add_widget(self.leftbar)
 
     # EDITED
-    def layout_cols(self, ncomponents):
-        """Determine how many colums a GridLayout gets."""
-        elems = ncomponents
-
-        if is_prime(elems) and elems > 2:
-            elems += 1
-
-        rows = 1
-        cols = elems
-
-        for i in xrange(1, elems):
-            if elems % i == 0 and rows < cols:
-                rows = i
-                cols = elems / i
-
-        return cols
-
-    # EDITED
-    def layout_components(self, vars):
-        """Create layout of components from selected vars."""
-        components_dict = dotdictify()
-
-        for i in sorted(vars):
-            components = i.split(":")
-            if components[0] in components_dict:
-                continue
-
-            components_dict[components[0]] = None
-
-        return components_dict
-
-    # EDITED
-    def layout_traverse(self, d, s=""):
-        temp = dict()
-        for k, v in sorted(d.iteritems()):
-            if isinstance(v, dict):
-                rlayout = self.layout_traverse(v, s+k+'.')
-                c = Component(s+k, self, size_hint=(1,0.5))
-                self.components_list[s+k] = c
-                temp_layout = BoxLayout(orientation='vertical')
-                temp_layout.add_widget(c)
-                temp_layout.add_widget(rlayout)
-                temp[k] = temp_layout
-                #print k, s+k
-
-                # Clock.schedule_interval(
-                #     c.update,
-                #     1.0 / self.settings['framerate']
-                # )
-            else:
-                c = Component(s+k, self)
-                self.components_list[s+k] = c
-                temp[k] = c
-                #print k, s+k
-                # Clock.schedule_interval(
-                #     c.update,
-                #     1.0 / self.settings['framerate']
-                # )
-
-        cols = self.layout_cols(len(d))
-
-        layout = GridLayout(cols=cols, spacing=0)
+    def init_core_grid(self):
+        """
+        Initialize the core grid of the primary back-end, and the views that
+        follow its selection.
+        """
+        Session.init_core_grid(self)
+        if not self.core_grid:
+            return
 
-        for k, v in sorted(temp.iteritems()):
-            #print s+":"+k
-            layout.add_widget(v)
-        return layout
+        self.leaderboard = Leaderboard(sorted(self.components_list))
+        self.init_correlation()
 
-    # EDITED
-    def init_core_grid(self):
-        """Initialize the core grid on the left side of the window."""
-
-        # Create components structure in a dictionary
-        components_dict = self.layout_components(self.sample_vars)
-
-        cols = self.layout_cols(len(components_dict))
-        self.core_grid = GridLayout(cols=cols, spacing=10)
-
-        for component1 in sorted(components_dict):
-            layout = BoxLayout(orientation='vertical')
-            c = Component(component1, self, size_hint=(1,0.2))
-            self.components_list[component1] = c
-            layout.add_widget(c)
-            if components_dict[component1] != None:
-                layout.add_widget(self.layout_traverse(components_dict[component1], component1+'.'))
-            self.l1_components_grid_list[component1] = layout
-            self.core_grid.add_widget(layout)
-            # Clock.schedule_interval(
-            #     c.update,
-            #     1.0 / self.settings['framerate']
-            # )
-
-        #popup buttons
-        for k in self.sample_vars:
-            components = k.split(':')
-            if components[0] in self.components_list:
-                if len(components) < 2:
-                    self.components_list[components[0]].set_data(components[0])
-                elif len(components) > 2:
-                    self.components_list[components[0]].set_data(':'.join(components[1:]))
-                else:
-                    self.components_list[components[0]].set_data(components[1])
-
-        self.layout.add_widget(self.core_grid)
+        if not self.activity_raster:
+            self.activity_raster = ActivityRaster(self)
+        self.activity_raster.reset(self.frame_schema.components)
+        self.init_archive_writer()
         
 
     def init_rightbar(self):
@@ -438,6 +551,64 @@ class ManyMan(App):
         b.bind(on_press=self.set_step_open)
         self.finished_list.add_widget(b)
 
+        if self.archive_player:
+            b = Button(
+                text='Go To Cycle',
+                size_hint_y=None,
+                height=40
+            )
+            b.bind(on_press=self.seek_open)
+            self.finished_list.add_widget(b)
+
+        self.auto_delay_button = Button(
+            text='Auto Delay: off',
+            size_hint_y=None,
+            height=40
+        )
+        self.auto_delay_button.bind(on_press=self.toggle_auto_delay)
+        self.finished_list.add_widget(self.auto_delay_button)
+
+        b = Button(
+            text='Performance',
+            size_hint_y=None,
+            height=40
+        )
+        b.bind(on_press=self.toggle_perf_overlay)
+        self.finished_list.add_widget(b)
+
+        b = Button(
+            text='Correlation',
+            size_hint_y=None,
+            height=40
+        )
+        b.bind(on_press=self.show_correlation)
+        self.finished_list.add_widget(b)
+
+        b = Button(
+            text='Activity Raster',
+            size_hint_y=None,
+            height=40
+        )
+        b.bind(on_press=self.show_raster)
+        self.finished_list.add_widget(b)
+
+        b = Button(
+            text='Task Timeline',
+            size_hint_y=None,
+            height=40
+        )
+        b.bind(on_press=self.show_gantt)
+        self.finished_list.add_widget(b)
+
+        if self.simulators:
+            self.diff_button = Button(
+                text='View: side by side',
+                size_hint_y=None,
+                height=40
+            )
+            self.diff_button.bind(on_press=self.toggle_diff_view)
+            self.finished_list.add_widget(self.diff_button)
+
         self.status_label = Label(text="simulator status\n\npauzed", halign='center', valign='top', text_size=(200,None))
         self.kernel_label = Label(text="kernel cycle\n\n0000", halign='center', valign='top', text_size=(200,None))
         self.delay_label = Label(text="current send delay\n\n0000", halign='center', valign='top', text_size=(200,None))
@@ -448,18 +619,68 @@ class ManyMan(App):
         self.rightbar.add_widget(self.delay_label)
         self.rightbar.add_widget(self.step_label)
 
+        self.perf_overlay = PerfOverlay(self)
+        if self.settings['perf_overlay']:
+            self.toggle_perf_overlay()
+
+        if self.settings['auto_delay']:
+            self.toggle_auto_delay()
+
         self.layout.add_widget(self.rightbar)
 
+    def toggle_perf_overlay(self, *largs):
+        """Show or hide the performance overlay in the right sidebar."""
+        if self.perf_overlay.showing:
+            self.perf_overlay.hide()
+            self.rightbar.remove_widget(self.perf_overlay)
+        else:
+            self.rightbar.add_widget(self.perf_overlay)
+            self.perf_overlay.show()
+
+    def toggle_diff_view(self, *largs):
+        """
+        Switch between showing the grids of the additional back-ends as they
+        are, and as their difference with the primary back-end.
+        """
+        self.diff_view = not self.diff_view
+        if self.diff_view:
+            self.diff_button.text = 'View: difference'
+        else:
+            self.diff_button.text = 'View: side by side'
+
+    def toggle_auto_delay(self, *largs):
+        """Switch the automatic send delay controllers on or off."""
+        if self.archive_player:
+            return
+        enabled = not self.delay_controller.enabled
+        for session in self.sessions():
+            if enabled:
+                session.delay_controller.start()
+            else:
+                session.delay_controller.stop()
+        if enabled:
+            self.auto_delay_button.text = 'Auto Delay: on'
+        else:
+            self.auto_delay_button.text = 'Auto Delay: off'
+
     def pause_sim(self, *largs):
-        self.comm.pause_sim()
+        for backend in self.backends():
+            backend.pause_sim()
 
     def resume_sim(self, *largs):
-        self.comm.resume_sim()
+        for backend in self.backends():
+            backend.resume_sim()
 
     def change_delay(self, delay):
         try:
             delay = float(delay)
-            self.comm.change_delay(delay)
+            if self.delay_controller.enabled:
+                # A manual delay overrides the automatic controllers
+                for session in self.sessions():
+                    session.delay_controller.override(delay)
+                self.auto_delay_button.text = 'Auto Delay: off'
+            for backend in self.backends():
+                backend.change_delay(delay)
         except ValueError:
             print "Not a float"
 
@@ -505,7 +726,8 @@ class ManyMan(App):
     def set_step(self, steps):
         try:
             steps = int(steps)
-            self.comm.set_step(steps)
+            for backend in self.backends():
+                backend.set_step(steps)
         except ValueError:
             print "Not a int"
 
@@ -548,6 +770,60 @@ class ManyMan(App):
         content.add_widget(submit)
         self.set_step_popup.content = content
 
+    def seek(self, cycle):
+        """Continue browsing the archive at the given kernel cycle."""
+        try:
+            self.archive_player.seek(int(cycle))
+        except ValueError:
+            print "Not a int"
+
+    def seek_open(self, *largs):
+        """Handler when the 'Go To Cycle' button is pressed."""
+        self.seek_popup.title = "Go to kernel cycle (%d-%d)" % \
+            self.archive_player.cycle_range()
+        self.seek_popup.open()
+
+    def init_seek(self):
+        """Initialize the 'Go To Cycle' popup of the archive browser."""
+        self.seek_popup = Popup(
+            title="Go to kernel cycle",
+            size_hint=(None, None),
+            size=(600, 160)
+        )
+
+        content = GridLayout(cols=1, spacing=20)
+
+        inputs = FloatLayout(orientation='horizontal')
+        inputs.add_widget(
+            Label(
+                text='Cycle:',
+                text_size=(150, None),
+                padding_x=5,
+                size_hint=(.25, None),
+                height=40,
+                pos_hint={'x': 0, 'y': 0}
+            )
+        )
+        self.seek_input = TextInput(
+            multiline=False,
+            size_hint=(.75, None),
+            height=40,
+            pos_hint={'x': .25, 'y': 0}
+        )
+        inputs.add_widget(self.seek_input)
+        content.add_widget(inputs)
+
+        submit = Button(text='Go', size_hint=(1, None), height=30)
+        submit.bind(on_press=self.process_seek)
+        content.add_widget(submit)
+        self.seek_popup.content = content
+
+    def process_seek(self, *largs):
+        if self.seek_input.text:
+            self.seek(self.seek_input.text)
+        self.seek_popup.dismiss()
+        self.seek_input.text = ''
+
     def process_change_delay(self, *largs):
         if self.delay_input.text:
             self.change_delay(self.delay_input.text)
@@ -622,6 +898,10 @@ class ManyMan(App):
         button_container.add_widget(button)
         self.leftbar.add_widget(button_container)
 
+    def init_leaderboard(self):
+        """Initialize the panel listing the most active components."""
+        self.leftbar.add_widget(LeaderboardPanel(self))
+
     def init_program_info(self):
         """Initialize the program information text on the right top corner."""
         logo = FloatLayout(size_hint=(None, None), size=(290, 60))
@@ -787,8 +1067,7 @@ class ManyMan(App):
     #EDITED!
     def selection_new(self, new_vars):
         new_vars = new_vars.split('\n')
-        self.current_vars2 = new_vars
-        self.comm.selection_new(new_vars)
+        self.send_selection(new_vars)
 
     #EDITED!
     def selection_new2(self, *largs):
@@ -796,8 +1075,131 @@ class ManyMan(App):
         if set(new_vars) == set(self.current_vars):
             print "same selection"
         else:
-            self.current_vars2 = new_vars
-            self.comm.selection_new(new_vars)
+            self.send_selection(new_vars)
+
+    def send_selection(self, new_vars):
+        """Request the given selection of vars from all back-ends."""
+        for session in self.sessions():
+            if session.backend:
+                session.current_vars2 = new_vars
+                session.backend.selection_new(new_vars)
+
+    def init_correlation(self):
+        """
+        Start a new correlation window over the pinned vars. Pinned names may
+        contain a '*' to pin all matching vars.
+        """
+        names = self.frame_schema.full_names()
+        pinned = []
+        columns = []
+        for pattern in self.correlation_vars:
+            pattern = re.compile(
+                '^%s$' % re.escape(pattern).replace(r'\*', '.+?')
+            )
+            for column, name in enumerate(names):
+                if pattern.match(name) and not column in columns:
+                    pinned.append(name)
+                    columns.append(column)
+
+        self.correlation = SlidingCorrelation(
+            pinned,
+            columns,
+            self.settings['correlation_window']
+        )
+        if self.correlation_legend:
+            self.correlation_legend.text = self.correlation_text()
+
+    def correlation_text(self):
+        """Retrieve the legend of the correlation heatmap."""
+        if not self.correlation:
+            return "No vars pinned.\n\nPin vars in the popup of a component."
+        return "Rates over the last %d frames\n\n%s" % (
+            self.correlation.window,
+            '\n'.join("%d: %s" % (i, name) for i, name in \
+                enumerate(self.correlation.names))
+        )
+
+    def show_correlation(self, *largs):
+        """Show the correlation popup."""
+        if not self.correlation_window:
+            self.correlation_window = Popup(
+                title="Correlation of the pinned vars (top to bottom, " \
+                    "left to right)",
+                size_hint=(None, None),
+                size=(650, 450)
+            )
+
+            content = BoxLayout(orientation='horizontal', spacing=10)
+            self.correlation_view = CorrelationView(self)
+            content.add_widget(self.correlation_view)
+
+            self.correlation_legend = Label(
+                halign='left',
+                valign='top',
+                text_size=(200, None),
+                size_hint_x=None,
+                width=200
+            )
+            content.add_widget(self.correlation_legend)
+            self.correlation_window.content = content
+
+            self.correlation_window.bind(
+                on_open=self.correlation_open,
+                on_dismiss=self.correlation_dismiss
+            )
+
+        self.correlation_legend.text = self.correlation_text()
+        self.correlation_window.open()
+
+    def correlation_open(self, *largs):
+        """Handler when the correlation popup is opened."""
+        self.correlation_view.update()
+        Clock.schedule_interval(
+            self.correlation_view.update,
+            self.settings['correlation_interval']
+        )
+
+    def correlation_dismiss(self, *largs):
+        """Handler when the correlation popup is closed."""
+        Clock.unschedule(self.correlation_view.update)
+
+    def show_raster(self, *largs):
+        """Show the activity raster popup."""
+        if not self.raster_window:
+            self.raster_window = Popup(
+                title="Activity per component (newest frame on the right)",
+                size_hint=(.9, .9),
+                content=self.activity_raster
+            )
+        self.raster_window.open()
+
+    def show_gantt(self, *largs):
+        """Show the task placement timeline popup."""
+        if not self.gantt_window:
+            self.gantt_chart = GanttChart(self)
+            self.gantt_window = Popup(
+                title="Task placement (colour per core, dimmed when " \
+                    "stopped)",
+                size_hint=(.9, .9),
+                content=self.gantt_chart
+            )
+            self.gantt_window.bind(
+                on_open=self.gantt_open,
+                on_dismiss=self.gantt_dismiss
+            )
+        self.gantt_window.open()
+
+    def gantt_open(self, *largs):
+        """Handler when the task placement popup is opened."""
+        self.gantt_chart.update()
+        Clock.schedule_interval(
+            self.gantt_chart.update,
+            self.settings['gantt_interval']
+        )
+
+    def gantt_dismiss(self, *largs):
+        """Handler when the task placement popup is closed."""
+        Clock.unschedule(self.gantt_chart.update)
 
     def show_help(self, *largs):
         """Show the help popup."""
@@ -901,14 +1303,48 @@ class ManyMan(App):
 
     def frequency_set(self, ins):
         Logger.debug("ManyMan: slider %s set" % ins.data)
+        if not self.backend:
+            return
         if ins.data != None:
-            self.comm.set_core_frequency(
+            self.backend.set_core_frequency(
                 ins.val,
                 self.settings['voltage_islands'][ins.data][0]
             )
         else:
             Logger.info("ManyMan: ssaasdsslider %s set" % ins.data)
-            self.comm.set_core_frequency(ins.val)
+            self.backend.set_core_frequency(ins.val)
+
+    def toggle_task_selection(self, t):
+        """Add the given task to or remove it from the task selection."""
+        if t.tid in self.selected_tasks:
+            self.deselect_task(t)
+        else:
+            Logger.debug("ManyMan: Selected task %s" % t.tid)
+            self.selected_tasks[t.tid] = t
+            t.selected = True
+
+    def deselect_task(self, t):
+        """Remove the given task from the task selection."""
+        if self.selected_tasks.pop(t.tid, None):
+            t.selected = False
+
+    def clear_task_selection(self):
+        """Empty the task selection."""
+        for t in self.selected_tasks.values():
+            t.selected = False
+        self.selected_tasks = dict()
+
+    def task_group(self, t):
+        """
+        Retrieve the tasks an action on the given task applies to: all
+        selected tasks of the same kind when the task is selected, only the
+        task itself otherwise.
+        """
+        if not t.tid in self.selected_tasks:
+            return [t]
+
+        return [s for s in self.selected_tasks.values() \
+            if s.__class__ == t.__class__]
 
     def get_cpu_load(self):
         """Getter for the current CPU load. MAY NOT BE CALLED."""
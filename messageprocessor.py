@@ -18,8 +18,12 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from codec import select_codec
+from collections import deque
+from kivy.clock import Clock
 from kivy.logger import Logger
-import json
+from threading import Lock
+from time import time
 
 
 # List of valid message types.
@@ -32,22 +36,150 @@ known_msg_types = (
     'invalid_message'
 )
 
+# Codecs of the decode stage, by name
+codecs = dict()
+
 
 class InvalidMessage(Exception):
     """Define the InvalidMessage exception. Only for naming conventions."""
     pass
 
 
+def decode_message(codec_name, msg):
+    """
+    Decode the given message and prepare its contents for the apply stage.
+    Runs in the decode workers, so it may not touch any front-end state.
+    Returns the decoded message and the time it took.
+    """
+    start = time()
+    if not codec_name in codecs:
+        codecs[codec_name] = select_codec(codec_name)
+    data = codecs[codec_name].loads(msg)
+
+    if data.get('type') == 'sim_data':
+        prepare_sim_data(data['content'])
+
+    return data, time() - start
+
+
+def prepare_sim_data(content):
+    """
+    Split the samples of a sim_data message into a sorted list of var names
+    and a list of their values. As long as the selection does not change,
+    the names are the same for every frame.
+    """
+    data = content.pop('data')
+    names = sorted(data)
+
+    content['cycle'] = data['kernel.cycle']
+    content['names'] = names
+    content['values'] = [data[k] for k in names]
+
+
+class Decoded:
+    """Result of a message that was decoded in the receiving thread."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.result
+
+
 class MessageProcessor:
-    """Processor for all messages that arrive in ManyMan's front-end."""
+    """
+    Processor for all messages that arrive in ManyMan's front-end. Messages
+    go through three stages: they are received by the communicator, decoded
+    by a pool of worker processes, and applied in order on the main thread.
+    """
 
     def __init__(self, comm):
         self.comm = comm
+        self.counters = comm.manyman.counters
+
+        self.pool = None
+        self.pending = deque()
+        self.lock = Lock()
+        self.received_at = time()
+
+        # State of the cores and tasks as of the last status message
+        self.status_cores = dict()
+        self.status_tasks = dict()
+        self.status_counts = dict()
+        self.status_seq = None
+        self.status_resyncing = False
+
+    def start(self, pool):
+        """
+        Start decoding messages with the given pool of decode workers, if
+        any, and applying decoded messages on the main thread.
+        """
+        self.pool = pool
+        Clock.schedule_interval(self.apply_pending, 0)
+
+    def stop(self):
+        """Stop decoding and applying messages."""
+        Clock.unschedule(self.apply_pending)
+        self.pool = None
 
     def process(self, msg):
-        """Process the given message 'msg'."""
+        """
+        Process the given message 'msg'. Called from the receiving thread;
+        queues the message to be decoded and applied.
+        """
+        if not self.comm.initialized:
+            # The front-end waits for the initialization message before the
+            # main loop runs, so apply it right away
+            self.apply(msg, Decoded(decode_message(self.comm.codec.name, msg)))
+            return
+
+        if self.pool:
+            result = self.pool.apply_async(
+                decode_message,
+                (self.comm.codec.name, msg)
+            )
+        else:
+            result = Decoded(decode_message(self.comm.codec.name, msg))
+
+        self.lock.acquire()
+        self.pending.append((self.comm.received_at, msg, result))
+        self.counters.queue_depth = len(self.pending)
+        self.lock.release()
+
+    def apply_pending(self, dt):
+        """
+        Apply the decoded messages in the order they were received, within
+        the time budget of a single frame. When too many messages are
+        pending, sim_data frames are dropped instead of applied.
+        """
+        settings = self.comm.manyman.settings
+        deadline = time() + settings['apply_budget']
+
+        while self.pending and time() < deadline:
+            received_at, msg, result = self.pending[0]
+            if not result.ready():
+                break
+
+            self.lock.acquire()
+            self.pending.popleft()
+            self.counters.queue_depth = len(self.pending)
+            self.lock.release()
+
+            if len(self.pending) >= settings['max_pending_frames']:
+                self.apply(msg, result, received_at, drop_frames=True)
+            else:
+                self.apply(msg, result, received_at)
+
+    def apply(self, msg, result, received_at=None, drop_frames=False):
+        """Apply the decoded message 'msg'."""
         try:
-            data = json.loads(msg)
+            data, decode_time = result.get()
+            self.counters.count_message(decode_time)
+            if received_at is not None:
+                self.received_at = received_at
             #print(data)
 
             if not data['type'] in known_msg_types:
@@ -56,6 +188,17 @@ class MessageProcessor:
                 raise InvalidMessage(
                     'Did not receive initialization message first.'
                 )
+            elif data['type'] == 'sim_data' and \
+                (drop_frames or not self.comm.manyman.started):
+                # The front-end can not keep up or is not ready for this
+                # frame; it still ends up in the archive
+                content = data['content']
+                self.comm.manyman.archive_frame(
+                    content['cycle'],
+                    content['names'],
+                    content['values']
+                )
+                self.counters.count_dropped()
             elif self.comm.manyman.started or not self.comm.initialized:
                 getattr(self, "process_" + data['type'])(data['content'])
         except Exception, e:
@@ -72,6 +215,8 @@ class MessageProcessor:
         self.comm.manyman.chip_cores = msg['cores']
         self.comm.manyman.sample_vars = msg['sample_vars']
         self.comm.manyman.current_vars = msg['default_vars']
+        self.comm.manyman.server_capabilities = \
+            set(msg.get('capabilities', []))
         if 'orientation' in msg:
             self.comm.manyman.chip_orientation = msg['orientation']
 
@@ -80,78 +225,181 @@ class MessageProcessor:
 
         self.comm.initialized = True
 
+        if self.comm.manyman.started:
+            # Connected after start-up; build the grid in the main thread
+            Clock.schedule_once(
+                lambda dt: self.comm.manyman.init_core_grid()
+            )
+
     def process_status(self, msg):
-        """Process a status message."""
+        """
+        Process a status message. A status message either contains a full
+        snapshot of the chip, or, in delta mode, only the cores and tasks
+        that changed since the message before it.
+        """
+        chip = msg['chip']
+
+        if 'seq' in msg:
+            if msg.get('delta', False) and \
+                (self.status_seq is None or msg['seq'] != self.status_seq + 1):
+                # Without the preceding status a delta can not be applied;
+                # ignore deltas until a full snapshot arrives
+                if not self.status_resyncing:
+                    Logger.warning(
+                        "MsgProcessor: Status %d arrived out of sequence; "
+                        "requesting a resync" % msg['seq']
+                    )
+                    self.status_resyncing = True
+                    self.comm.request_status_resync()
+                return
+            self.status_seq = msg['seq']
+
+        mm = self.comm.manyman
+        delta = msg.get('delta', False)
+
+        # Apply the cores first, so their loads keep updating whatever
+        # happens with the tasks
+        if delta:
+            cores = dict(
+                (int(i), f) for i, f in chip.get('Cores', {}).items()
+            )
+        else:
+            self.status_resyncing = False
+            cores = dict()
+            for i in mm.cores.keys():
+                cores[i] = chip['Cores'][i]
+        self.apply_cores(cores, chip.get('Power'))
+
+        if delta:
+            tasks = chip.get('Tasks', [])
+            removed = chip.get('Removed', [])
+        else:
+            # Determine which tasks changed since the previous snapshot
+            current = set()
+            tasks = []
+            for task in chip['Tasks']:
+                current.add(task['ID'])
+                if self.status_tasks.get(task['ID']) != task or \
+                    not mm.has_task(task['ID']):
+                    tasks.append(task)
+            removed = set(self.status_tasks) - current
+
+        self.apply_tasks(tasks, removed)
+
+    def apply_cores(self, cores, power):
+        """
+        Apply the core fields of a status message, by core index. Only the
+        cores that changed are updated; the others, including those left out
+        of a delta, merely feed their performance graphs their last known
+        load again.
+        """
         mm = self.comm.manyman
-        total_load = 0
-
-        # Update the loads of the cores
-        for i in mm.cores.keys():
-            core = mm.cores[i]
-            load = msg['chip']['Cores'][i]['CPU'] / 100.0
-            core.update_load(load)
-            total_load += load
-            mem = msg['chip']['Cores'][i]['MEM'] / 100.0
-            core.update_mem(mem)
-            core.frequency = msg['chip']['Cores'][i]['Frequency']
-            core.voltage = msg['chip']['Cores'][i]['Voltage']
-
-        task_ids = []
-        new_count = dict()
-
-        # Update all task information
-        for task in msg['chip']['Tasks']:
-            if mm.has_task(task['ID']):
-                t = mm.tasks[task['ID']]
+
+        for i, core in mm.cores.items():
+            fields = cores.get(i, self.status_cores.get(i))
+            if fields is None:
+                continue
+
+            if self.status_cores.get(i) == fields:
+                core.sample(fields['CPU'] / 100.0, fields['MEM'] / 100.0)
+                continue
+
+            self.status_cores[i] = fields
+            core.update_load(fields['CPU'] / 100.0)
+            core.update_mem(fields['MEM'] / 100.0)
+            core.frequency = fields['Frequency']
+            core.voltage = fields['Voltage']
+
+        # Calculate the total load
+        if mm.cores:
+            total_load = 0
+            for fields in self.status_cores.values():
+                total_load += fields['CPU'] / 100.0
+            total_load /= len(mm.cores)
+            Logger.debug(
+                "MsgProcessor: Total load: %.1f%%" % (total_load * 100.)
+            )
+            mm.cpu_load = total_load
+        if power is not None:
+            mm.cpu_power = power
+
+    def apply_tasks(self, tasks, removed):
+        """
+        Apply the changed tasks of a status message and the ids of the
+        removed tasks. The loads of all tasks are sampled, changed or not.
+        """
+        mm = self.comm.manyman
+        counts = self.status_counts
+        changed_counts = set()
+
+        # Record the placements before anything touches the task widgets, so
+        # the placement history is complete even for tasks that are not shown
+        for task in tasks:
+            mm.placements.record(
+                task['ID'],
+                task['Name'],
+                task['Core'],
+                task['Status']
+            )
+        for tid in removed:
+            mm.placements.close(tid)
+
+        # Update the tasks that changed
+        for task in tasks:
+            tid = task['ID']
+
+            # Keep the number of tasks per core up to date
+            old = self.status_tasks.get(tid)
+            if old and not old['Status'] in ["Finished", "Failed", "Stopped"]:
+                counts[old['Core']] -= 1
+                changed_counts.add(old['Core'])
+            if not task['Status'] in ["Finished", "Failed", "Stopped"]:
+                counts[task['Core']] = counts.get(task['Core'], 0) + 1
+                changed_counts.add(task['Core'])
+            self.status_tasks[tid] = task
+
+            if mm.has_task(tid):
+                t = mm.tasks[tid]
                 if task["Status"] in ["Finished", "Failed"] and \
                     not t.status in ["Finished", "Failed"]:
-                    mm.finish_task(task['ID'], task['Status'])
+                    mm.finish_task(tid, task['Status'])
                 elif not task['Status'] in ["Finished", "Failed"] and \
                     ((not t.core and task['Core'] >= 0) or \
                     (t.core and t.core.index != task['Core'])):
-                    if task['Core'] < 0:
-                        mm.move_task(t)
-                    else:
-                        mm.move_task(t, mm.cores[task['Core']])
+                    mm.move_task(t, mm.cores.get(task['Core']))
             else:
                 t = mm.add_task(
-                    task['ID'],
+                    tid,
                     task['Name'],
                     task['Core'],
                     task['Status']
                 )
 
-            # Count the number of tasks per core
-            if not task['Status'] in ["Finished", "Failed", "Stopped"]:
-                if task['Core'] in new_count:
-                    new_count[task['Core']] += 1
-                else:
-                    new_count[task['Core']] = 1
-
             if t:
-                task_ids.append(task['ID'])
                 t.status = task['Status']
+
+        # Remove all stopped tasks from the system
+        for tid in removed:
+            old = self.status_tasks.pop(tid, None)
+            if old and not old['Status'] in ["Finished", "Failed", "Stopped"]:
+                counts[old['Core']] -= 1
+                changed_counts.add(old['Core'])
+            if mm.has_task(tid):
+                Logger.debug("MsgProcessor: %s no longer running" % tid)
+                mm.remove_task(tid)
+
+        # Feed the performance graphs of all tasks on a core, changed or not
+        for tid, task in self.status_tasks.items():
+            if mm.has_task(tid):
+                t = mm.tasks[tid]
                 if t.core:
                     t.load_cpu = task['CPU']
                     t.load_mem = task['MEM']
 
-        # Update the number of running tasks per core
-        for core in range(len(mm.cores)):
-            count = 0
-            if core in new_count:
-                count = new_count[core]
-            mm.cores[core].pending_count = count
-
-        # Remove all stopped tasks from the system
-        for task in filter(lambda x: x not in task_ids, mm.tasks):
-            Logger.debug("MsgProcessor: %s no longer running" % task)
-            mm.remove_task(task)
-
-        # Calculate the total load
-        total_load /= len(mm.cores)
-        Logger.debug("MsgProcessor: Total load: %.1f%%" % (total_load * 100.))
-        mm.cpu_load = total_load
-        mm.cpu_power = msg['chip']['Power']
+        # Update the number of running tasks of the cores whose count changed
+        for core in changed_counts:
+            if core in mm.cores:
+                mm.cores[core].pending_count = counts[core]
 
     def process_task_output(self, msg):
         """Process a task_output message."""
@@ -161,11 +409,16 @@ class MessageProcessor:
         t = self.comm.manyman.tasks[msg['id']]
         t.set_output(msg['output'])
 
+        if msg.get('pushed', False):
+            # Return the flow control credit of the consumed output
+            self.comm.ack_output(
+                msg['id'],
+                sum(len(chunk) for chunk in msg['output'])
+            )
+
     def process_sim_data(self, msg):
         mm = self.comm.manyman
         #mm.components_list['cpu0'].update_load(0.5)
-        mm.previous_kernel_cycle = mm.current_kernel_cycle
-        mm.current_kernel_cycle = msg['data']['kernel.cycle']
         delay = msg['status']['delay']
         status = msg['status']['sim']
         step = msg['status']['step']
@@ -174,24 +427,13 @@ class MessageProcessor:
             mm.status_label.text = "simulator status\n\npaused"
         else:
             mm.status_label.text = "simulator status\n\nrunning"
-        mm.kernel_label.text = "kernel cycle\n\n" + str(mm.current_kernel_cycle)
         mm.delay_label.text = "current send delay\n\n" + str(delay)
         mm.step_label.text = "current steps\n\n" + str(step)
+        mm.current_delay = delay
+
+        mm.apply_frame(msg['cycle'], msg['names'], msg['values'])
 
-        for k, v in msg['data'].items():
-            #print k
-            components = k.split(':')
-            if components[0] in mm.components_list:
-                if len(components) < 2:
-                    mm.components_list[components[0]].update_data(components[0], v)
-                elif len(components) > 2:
-                    mm.components_list[components[0]].update_data(':'.join(components[1:]), v)
-                else:
-                    mm.components_list[components[0]].update_data(components[1], v)
-                #print components[0], mm.components_list[components[0]].get_data(components[0])
-                #if v != 0:
-                #    mm.components_list[components[0]].update_load(0.5)
-                #print components[0] + ': ' + str(v)
+        self.counters.count_frame(time() - self.received_at)
 
     def process_selection_set(self, msg):
         mm = self.comm.manyman
@@ -199,11 +441,7 @@ class MessageProcessor:
         mm.sample_vars = msg['sample_vars']
         mm.current_vars = mm.current_vars2
 
-        mm.layout.remove_widget(mm.rightbar)
-        mm.layout.remove_widget(mm.core_grid)
-
         mm.init_core_grid()
-        mm.layout.add_widget(mm.rightbar)
 
         mm.comm.selection_send()
 
@@ -0,0 +1,135 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from collections import deque
+from itertools import islice
+from kivy.logger import Logger
+
+
+def encode(chunk):
+    """Retrieve the bytes of an output chunk as they are written to disk."""
+    if isinstance(chunk, unicode):
+        return chunk.encode('utf-8')
+    return chunk
+
+
+class OutputRing(object):
+    """
+    Bounded store for the output of a task. Only the most recent chunks are
+    kept in memory. Older chunks are read back from the task's output file,
+    using an index of the file offset of every 'stride'-th chunk. The stride
+    doubles whenever the index fills up, so the index stays as small as the
+    ring; reads from the file start and end at the nearest indexed chunks.
+    """
+
+    def __init__(self, capacity, path=None, writer=None):
+        self.path = path
+        self.writer = writer
+
+        self.chunks = deque(maxlen=capacity)
+        self.sizes = deque(maxlen=capacity)
+        self.offset = 0
+        self.count = 0
+        self.size = 0
+
+        self.marks = array('L')
+        self.stride = 1
+        self.max_marks = max(2, capacity)
+
+    def __len__(self):
+        """Retrieve the total number of chunks ever appended."""
+        return self.count
+
+    def append(self, output):
+        """Append the given list of output chunks."""
+        for chunk in output:
+            if self.count % self.stride == 0:
+                self.mark()
+            size = len(encode(chunk))
+            if len(self.chunks) == self.chunks.maxlen:
+                # The oldest chunk drops out of memory, or this one when no
+                # chunks are kept at all
+                self.offset += self.sizes[0] if self.sizes else size
+            self.chunks.append(chunk)
+            self.sizes.append(size)
+            self.size += size
+            self.count += 1
+
+    def mark(self):
+        """Index the file offset of the chunk about to be appended."""
+        self.marks.append(self.size)
+        if len(self.marks) > self.max_marks:
+            # Keep every other mark and double the stride
+            self.marks = self.marks[::2]
+            self.stride *= 2
+
+    def first(self):
+        """Retrieve the index of the oldest chunk still kept in memory."""
+        return self.count - len(self.chunks)
+
+    def read(self, start, end):
+        """
+        Retrieve the output of the chunks from 'start' up to 'end'. Output
+        read from the file may include some chunks around the given range.
+        """
+        start = max(0, start)
+        end = min(end, self.count)
+        first = self.first()
+
+        parts = []
+        if start < first:
+            parts.append(self.read_file(start, min(end, first)))
+            start = first
+        if start < end:
+            parts.extend(islice(self.chunks, start - first, end - first))
+
+        return "".join(parts)
+
+    def read_file(self, start, end):
+        """Read the output of the chunks from 'start' up to 'end' from disk."""
+        if not self.path:
+            return ""
+
+        if self.writer:
+            # Make sure the requested output has been written
+            self.writer.flush(self.path)
+
+        # Only chunks still in memory and indexed chunks have a known offset
+        first = self.first()
+        begin = self.marks[start // self.stride]
+        stop = self.offset
+        if end < first:
+            following = -(-end // self.stride)
+            if following < len(self.marks):
+                stop = min(stop, self.marks[following])
+
+        try:
+            f = open(self.path, "rb")
+            try:
+                f.seek(begin)
+                data = f.read(stop - begin)
+            finally:
+                f.close()
+        except IOError, e:
+            Logger.warning("OutputRing: Could not read %s: %s" % (self.path, e))
+            return ""
+
+        return data.decode('utf-8', 'replace')
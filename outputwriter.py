@@ -0,0 +1,170 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from kivy.logger import Logger
+from os import mkdir
+from os.path import isdir
+from threading import Condition, Lock, Thread
+
+
+class OutputWriter(Thread):
+    """
+    Shared writer for the task output files. Buffers the written output and
+    flushes it from a background thread, either periodically or when enough
+    output is buffered. File handles are kept open in a pool that closes the
+    least recently used handle when the pool is full.
+    """
+
+    def __init__(self, folder, max_open, flush_interval, flush_size):
+        self.folder = folder
+        self.max_open = max_open
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        self.running = True
+        self.cond = Condition(Lock())
+        self.io_lock = Lock()
+        self.buffers = dict()
+        self.buffered = 0
+        self.closing = set()
+        self.handles = OrderedDict()
+
+        Thread.__init__(self)
+        self.daemon = True
+
+    def write(self, path, data):
+        """Buffer the given data to be appended to the file at 'path'."""
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+
+        self.cond.acquire()
+        try:
+            self.buffers.setdefault(path, []).append(data)
+            self.buffered += len(data)
+            if self.buffered >= self.flush_size:
+                self.cond.notify()
+        finally:
+            self.cond.release()
+
+    def close(self, path):
+        """Close the file at 'path' once its buffered output is written."""
+        self.cond.acquire()
+        self.closing.add(path)
+        self.cond.notify()
+        self.cond.release()
+
+    def flush(self, path=None):
+        """
+        Write the buffered output to disk right away, for the given file only
+        or for all files. The io lock is held from taking the buffers until
+        they are written, so concurrent flushes write the chunks of a file
+        in order.
+        """
+        self.io_lock.acquire()
+        try:
+            self.cond.acquire()
+            try:
+                if path is None:
+                    buffers, self.buffers = self.buffers, dict()
+                    self.buffered = 0
+                else:
+                    buffers = dict()
+                    if path in self.buffers:
+                        buffers[path] = self.buffers.pop(path)
+                        self.buffered -= sum(len(d) for d in buffers[path])
+            finally:
+                self.cond.release()
+
+            for p, data in buffers.items():
+                self._handle(p).write("".join(data))
+            if path is None:
+                for f in self.handles.values():
+                    f.flush()
+            elif path in self.handles:
+                self.handles[path].flush()
+        finally:
+            self.io_lock.release()
+
+    def stop(self):
+        """Write all buffered output and close all files."""
+        self.cond.acquire()
+        self.running = False
+        self.cond.notify()
+        self.cond.release()
+        if self.is_alive():
+            self.join()
+
+        self.flush()
+        self.io_lock.acquire()
+        for f in self.handles.values():
+            f.close()
+        self.handles.clear()
+        self.io_lock.release()
+
+    def run(self):
+        """Periodically write the buffered output to disk."""
+        while self.running:
+            self.cond.acquire()
+            try:
+                if self.buffered < self.flush_size and not self.closing:
+                    self.cond.wait(self.flush_interval)
+                closing, self.closing = self.closing, set()
+            finally:
+                self.cond.release()
+
+            try:
+                self.flush()
+                self._close_files(closing)
+            except Exception, e:
+                Logger.error("OutputWriter: Could not write output: %s" % e)
+
+    def _close_files(self, paths):
+        """Close the handles of the given files, if opened."""
+        self.io_lock.acquire()
+        try:
+            for path in paths:
+                f = self.handles.pop(path, None)
+                if f:
+                    f.close()
+        finally:
+            self.io_lock.release()
+
+    def _handle(self, path):
+        """
+        Retrieve an open handle for the given file. Must be called with the
+        io lock held.
+        """
+        if path in self.handles:
+            # Mark the handle as most recently used
+            f = self.handles.pop(path)
+            self.handles[path] = f
+            return f
+
+        if not isdir(self.folder):
+            mkdir(self.folder)
+
+        while len(self.handles) >= self.max_open:
+            # Close the least recently used handle
+            self.handles.popitem(last=False)[1].close()
+
+        f = open(path, "a")
+        self.handles[path] = f
+        return f
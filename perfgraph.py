@@ -23,6 +23,25 @@ from kivy.graphics import Color, Line
 from kivy.logger import Logger
 from kivy.uix.label import Label
 from kivy.uix.widget import Widget
+from perfstats import counters
+from timeseries import TimeSeries
+
+
+def minmax_columns(mins, maxs, columns):
+    """
+    Reduce the buckets with the given minimums and maximums to at most
+    'columns' columns. Returns the (minimum, maximum) of every column.
+    """
+    n = len(mins)
+    if n <= columns:
+        return zip(mins, maxs)
+
+    result = []
+    for c in range(columns):
+        start = c * n // columns
+        end = (c + 1) * n // columns
+        result.append((min(mins[start:end]), max(maxs[start:end])))
+    return result
 
 
 class PerfGraph(Widget):
@@ -41,6 +60,16 @@ class PerfGraph(Widget):
 
         # Initial load is all zeroes
         self.load = [0] * self.history
+
+        # All values since the graph was first visible, with rollups for
+        # showing all of them. Created on first display, so the many graphs
+        # that are never looked at keep no history.
+        self.series = None
+        self.count = 0
+        self.whole_run = False
+        self.columns = []
+        self.columns_key = None
+
         self.label = Label(text=("%s 0%s" % (self.content, self.unit)))
 
         self.mainline = None
@@ -73,13 +102,7 @@ class PerfGraph(Widget):
             if self.canvas.indexof(self.mainline) < 0:
                 return
 
-            points = []
-            for i in range(self.history):
-                points.extend([
-                    self.pos[0] + i * unit_width,
-                    self.pos[1] + self.load[i] * self.height
-                ])
-            self.mainline.points = points
+            self.mainline.points = self.main_points()
 
             for tid in self.lines.keys():
                 points = []
@@ -109,13 +132,7 @@ class PerfGraph(Widget):
             if self.canvas.indexof(self.mainline) < 0:
                 return
 
-            points = []
-            for i in range(self.history):
-                points.extend([
-                    self.pos[0] + i * unit_width,
-                    self.pos[1] + self.load[i] * self.height
-                ])
-            self.mainline.points = points
+            self.mainline.points = self.main_points()
 
             for tid in self.lines.keys():
                 points = []
@@ -160,6 +177,7 @@ class PerfGraph(Widget):
 
         if self.showing():
             # Only draw the line when visble
+            counters.count_redraw()
             unit_width = self.width / (self.history - 1.)
             points = []
             for i, load in enumerate(self.loads[tid]):
@@ -199,10 +217,19 @@ class PerfGraph(Widget):
             # Remove the oldest point of the line
             self.load.remove(self.load[0])
         self.load.append(value)
+        self.count += 1
+        if self.series is None and self.showing():
+            self.series = TimeSeries(
+                Config.getint('settings', 'timeseries_capacity')
+            )
+            for load in self.load:
+                self.series.append(load)
+        elif self.series is not None:
+            self.series.append(value)
 
         if self.showing():
             # Only update when visible
-            unit_width = self.width / (self.history - 1.)
+            counters.count_redraw()
 
             with self.canvas:
                 for l in self.axes_lines:
@@ -211,18 +238,7 @@ class PerfGraph(Widget):
                 self.draw_axes()
 
                 Color(*self.color, mode='hsv')
-                points = []
-                for i in range(self.history):
-                    if self.percent_scale:
-                        y = self.pos[1] + (self.load[i] / 100.) * self.height
-                    else:
-                        y = self.pos[1] + \
-                            (self.load[i] / float(max(1e-5, *self.load))) * \
-                            self.height
-                    points.extend([
-                        self.pos[0] + i * unit_width,
-                        y
-                    ])
+                points = self.main_points()
 
                 if self.canvas.indexof(self.mainline) < 0:
                     self.mainline = Line(points=points)
@@ -230,6 +246,72 @@ class PerfGraph(Widget):
                     self.mainline.points = points
 
             self.label.text = "%s: %f%s" % (self.content, value/100.0, self.unit)
+            if self.whole_run:
+                self.label.text += " (since first shown)"
+
+    def main_points(self):
+        """
+        Determine the points of the main line. The values are reduced to the
+        minimum and maximum per pixel column, so the line never has more than
+        two vertices per pixel and spikes remain visible. The reduction is
+        only redone when new values arrived or the width changed.
+        """
+        columns = max(2, int(self.width))
+        whole_run = self.whole_run and self.series is not None
+        key = (whole_run, self.count, columns)
+        if key != self.columns_key:
+            self.columns_key = key
+            if whole_run:
+                level = self.series.overview(columns)
+                self.columns = minmax_columns(level.mins, level.maxs, columns)
+            else:
+                self.columns = minmax_columns(self.load, self.load, columns)
+
+        return self.column_points(self.columns)
+
+    def column_points(self, columns):
+        """Determine the line points of the given (min, max) columns."""
+        if not columns:
+            return []
+
+        if self.percent_scale:
+            scale = 100.
+        else:
+            scale = float(max(1e-5, *[hi for lo, hi in columns]))
+        unit_width = self.width / max(1., len(columns) - 1.)
+
+        points = []
+        last = None
+        for i, (lo, hi) in enumerate(columns):
+            x = self.pos[0] + i * unit_width
+            lo_y = self.pos[1] + (lo / scale) * self.height
+            hi_y = self.pos[1] + (hi / scale) * self.height
+            if lo == hi:
+                points.extend([x, lo_y])
+                last = lo_y
+            elif last is not None and abs(last - hi_y) < abs(last - lo_y):
+                # Start at the extreme closest to the previous vertex
+                points.extend([x, hi_y, x, lo_y])
+                last = lo_y
+            else:
+                points.extend([x, lo_y, x, hi_y])
+                last = hi_y
+        return points
+
+    def on_touch_down(self, touch):
+        """
+        Handler when the graph is touched. A double tap switches between the
+        recent history and all values since the graph was first shown.
+        """
+        if not self.collide_point(touch.x, touch.y) or \
+            not touch.is_double_tap:
+            return super(PerfGraph, self).on_touch_down(touch)
+
+        self.whole_run = not self.whole_run
+        if self.showing() and self.mainline and \
+            self.canvas.indexof(self.mainline) >= 0:
+            self.mainline.points = self.main_points()
+        return True
 
     def draw_axes(self):
         """Draw the axes of the performance graph."""
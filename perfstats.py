@@ -0,0 +1,241 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from kivy.clock import Clock
+from kivy.uix.label import Label
+from time import time
+
+
+class PerfCounters(object):
+    """
+    Counters describing the health of the front-end. Producers only bump
+    plain attributes, so counting costs next to nothing; rates are derived
+    when a sample is taken.
+    """
+
+    def __init__(self):
+        # Monotonic totals, written by the producers
+        self.messages = 0
+        self.bytes = 0
+        self.frames = 0
+        self.dropped_frames = 0
+        self.decode_time = 0.0
+        self.frame_lag = 0.0
+        self.redraws = 0
+
+        # Instantaneous values, overwritten by the producers
+        self.queue_depth = 0
+
+        self._last_time = time()
+        self._last = self.totals()
+
+    def totals(self):
+        """Retrieve a copy of the monotonic totals."""
+        return (
+            self.messages,
+            self.bytes,
+            self.frames,
+            self.decode_time,
+            self.frame_lag,
+            self.redraws
+        )
+
+    def count_received(self, nbytes):
+        """Count 'nbytes' received bytes."""
+        self.bytes += nbytes
+
+    def count_message(self, decode_time):
+        """Count a message that took 'decode_time' seconds to decode."""
+        self.messages += 1
+        self.decode_time += decode_time
+
+    def count_frame(self, lag):
+        """
+        Count an applied sim_data frame that was applied 'lag' seconds after
+        it was received.
+        """
+        self.frames += 1
+        self.frame_lag += lag
+
+    def count_dropped(self, n=1):
+        """Count 'n' frames that were received but never applied."""
+        self.dropped_frames += n
+
+    def count_redraw(self):
+        """Count a redraw of a performance graph."""
+        self.redraws += 1
+
+    def sample(self):
+        """
+        Determine the rates since the previous sample. Returns a dictionary
+        with the derived values.
+        """
+        now = time()
+        current = self.totals()
+        dt = max(1e-6, now - self._last_time)
+        messages, nbytes, frames, decode_time, frame_lag, redraws = \
+            [c - l for c, l in zip(current, self._last)]
+
+        self._last_time = now
+        self._last = current
+
+        return {
+            'messages': messages / dt,
+            'bytes': nbytes / dt,
+            'frames': frames / dt,
+            'decode': decode_time / max(1, messages),
+            'lag': frame_lag / max(1, frames),
+            'redraws': redraws / dt,
+            'queue_depth': self.queue_depth,
+            'dropped_frames': self.dropped_frames
+        }
+
+
+class CombinedCounters(PerfCounters):
+    """
+    Sum of several sets of counters, such as those of all sessions, sampled
+    as a single set.
+    """
+
+    def __init__(self, sources):
+        # Function that retrieves the counters to combine
+        self.sources = sources
+        self._last_time = time()
+        self._last = self.totals()
+
+    def totals(self):
+        """Retrieve the sums of the monotonic totals."""
+        return tuple(sum(t) for t in zip(*[c.totals() for c in self.sources()]))
+
+    def sample(self):
+        """Determine the combined rates since the previous sample."""
+        sources = self.sources()
+        self.queue_depth = sum(c.queue_depth for c in sources)
+        self.dropped_frames = sum(c.dropped_frames for c in sources)
+        return PerfCounters.sample(self)
+
+
+# Counters of the front-end as a whole, such as the graph redraws. Every
+# session counts its own messages and frames.
+counters = PerfCounters()
+
+
+def count_tree(widget):
+    """
+    Count the widgets and canvas instructions in the tree below (and
+    including) the given widget.
+    """
+    widgets = 1
+    instructions = count_instructions(widget.canvas)
+    for child in widget.children:
+        w, i = count_tree(child)
+        widgets += w
+        instructions += i
+    return widgets, instructions
+
+
+def count_instructions(group):
+    """Count the instructions in the given instruction group recursively."""
+    children = getattr(group, 'children', None)
+    if not children:
+        return 0
+
+    count = len(children)
+    for child in children:
+        count += count_instructions(child)
+    return count
+
+
+class PerfOverlay(Label):
+    """
+    Label that shows the live health metrics of the front-end, summed over
+    all sessions.
+    """
+
+    def __init__(self, manyman, **kwargs):
+        self.manyman = manyman
+        self.showing = False
+        self.counters = CombinedCounters(
+            lambda: [counters] + [s.counters for s in manyman.sessions()]
+        )
+
+        settings = {
+            'text': 'performance\n\n...',
+            'halign': 'center',
+            'valign': 'top',
+            'text_size': (200, None)
+        }
+        settings.update(kwargs)
+
+        super(PerfOverlay, self).__init__(**settings)
+
+    def show(self):
+        """Start updating the overlay."""
+        if self.showing:
+            return
+
+        self.showing = True
+        self.counters.sample()
+        Clock.schedule_interval(
+            self.update,
+            self.manyman.settings['perf_overlay_interval']
+        )
+
+    def hide(self):
+        """Stop updating the overlay."""
+        self.showing = False
+        Clock.unschedule(self.update)
+
+    def update(self, *largs):
+        """Render the current metrics."""
+        stats = self.counters.sample()
+
+        widgets, instructions = 0, 0
+        root = self.get_root_window()
+        if root:
+            for child in root.children:
+                w, i = count_tree(child)
+                widgets += w
+                instructions += i
+
+        self.text = "performance\n\n" \
+            "render: %.1f fps\n" \
+            "messages: %.1f/s\n" \
+            "received: %.1f kB/s\n" \
+            "decode: %.2f ms/msg\n" \
+            "frames: %.1f/s\n" \
+            "frame lag: %.1f ms\n" \
+            "queue depth: %d\n" \
+            "dropped frames: %d\n" \
+            "graph redraws: %.1f/s\n" \
+            "widgets: %d\n" \
+            "instructions: %d" % (
+                Clock.get_fps(),
+                stats['messages'],
+                stats['bytes'] / 1024.,
+                stats['decode'] * 1000.,
+                stats['frames'],
+                stats['lag'] * 1000.,
+                stats['queue_depth'],
+                stats['dropped_frames'],
+                stats['redraws'],
+                widgets,
+                instructions
+            )
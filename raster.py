@@ -0,0 +1,195 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from colorsys import hsv_to_rgb
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.uix.widget import Widget
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def activity_colors(color_range):
+    """
+    Determine the RGBA colours of 256 activity levels, from black when idle
+    to the hue of a fully loaded core.
+    """
+    colors = []
+    for level in xrange(256):
+        a = level / 255.
+        hue = color_range[0] + a * (color_range[1] - color_range[0])
+        r, g, b = hsv_to_rgb(hue, 1., .2 + .8 * a if level else 0.)
+        colors.append((int(r * 255), int(g * 255), int(b * 255), 255))
+    return colors
+
+
+class ActivityRaster(Widget):
+    """
+    Raster of the activity of all components through time: a row per
+    component, a column per frame. The raster is a texture of which the
+    columns form a ring; every frame blits a single new column into it. The
+    ring is drawn as two quads, the columns after the newest one on the
+    left and the rest on the right, so the texture never has to repeat
+    (which NPOT textures do not support on GLES2). Tapping a row opens the
+    popup of its component.
+    """
+
+    def __init__(self, manyman, **kwargs):
+        self.manyman = manyman
+        self.columns = manyman.settings['raster_width']
+        self.components = []
+        self.starts = None
+        self.lengths = None
+        self.column = 0
+        self.texture = None
+
+        colors = activity_colors(manyman.settings['core_color_range'])
+        if numpy is not None:
+            self.colors = numpy.array(colors, dtype=numpy.uint8)
+        else:
+            self.colors = colors
+
+        super(ActivityRaster, self).__init__(**kwargs)
+
+        with self.canvas:
+            Color(1, 1, 1)
+            self.old_rect = Rectangle(pos=self.pos, size=self.size)
+            self.new_rect = Rectangle(pos=self.pos, size=(0, 0))
+
+        self.bind(pos=self.update_rect, size=self.update_rect)
+
+    def update_rect(self, *largs):
+        """Handler when the raster is moved or resized."""
+        self.scroll()
+
+    def reset(self, components):
+        """
+        Start a new raster for the given components, as (name, start, end)
+        slices of the frame schema.
+        """
+        self.components = [c[0] for c in components]
+        self.column = 0
+        if numpy is not None:
+            self.starts = numpy.array([c[1] for c in components], dtype=int)
+            self.lengths = numpy.array(
+                [max(1, c[2] - c[1]) for c in components],
+                dtype=float
+            )
+        else:
+            self.starts = [(c[1], c[2]) for c in components]
+
+        if not self.components:
+            self.texture = None
+            self.old_rect.texture = None
+            self.new_rect.texture = None
+            self.scroll()
+            return
+
+        self.texture = Texture.create(
+            size=(self.columns, len(self.components)),
+            colorfmt='rgba'
+        )
+        self.texture.mag_filter = 'nearest'
+        self.texture.wrap = 'clamp_to_edge'
+        self.texture.blit_buffer(
+            '\0' * (4 * self.columns * len(self.components)),
+            colorfmt='rgba',
+            bufferfmt='ubyte'
+        )
+        self.old_rect.texture = self.texture
+        self.new_rect.texture = self.texture
+        self.scroll()
+
+    def add(self, changed):
+        """
+        Add a column with the activity of every component in a frame: the
+        fraction of its vars that changed.
+        """
+        if self.texture is None:
+            return
+
+        if numpy is not None:
+            counts = numpy.add.reduceat(
+                numpy.asarray(changed, dtype=float),
+                self.starts
+            )
+            levels = (counts / self.lengths * 255).astype(int)
+            # The first component is the top row
+            pixels = self.colors[levels[::-1]].tostring()
+        else:
+            pixels = array('B')
+            for start, end in reversed(self.starts):
+                n = sum(1 for c in changed[start:end] if c)
+                pixels.extend(
+                    self.colors[n * 255 // max(1, end - start)]
+                )
+            pixels = pixels.tostring()
+
+        self.texture.blit_buffer(
+            pixels,
+            size=(1, len(self.components)),
+            pos=(self.column, 0),
+            colorfmt='rgba',
+            bufferfmt='ubyte'
+        )
+        self.column = (self.column + 1) % self.columns
+        self.scroll()
+
+    def scroll(self):
+        """Lay out the two quads so that the newest column ends up on the right."""
+        split = self.width * (self.columns - self.column) / self.columns
+        self.old_rect.pos = self.pos
+        self.old_rect.size = (split, self.height)
+        self.new_rect.pos = (self.x + split, self.y)
+        self.new_rect.size = (self.width - split, self.height)
+
+        if self.texture is not None:
+            self.old_rect.tex_coords = self.tex_coords(self.column,
+                                                       self.columns)
+            self.new_rect.tex_coords = self.tex_coords(0, self.column)
+        self.canvas.ask_update()
+
+    def tex_coords(self, start, end):
+        """
+        Texture coordinates of the columns from 'start' up to 'end'. The
+        texture may be backed by a larger power-of-two one, of which it only
+        covers uvsize.
+        """
+        u0, v0 = self.texture.uvpos
+        du, dv = self.texture.uvsize
+        left = u0 + du * start / self.columns
+        right = u0 + du * end / self.columns
+        return (left, v0, right, v0, right, v0 + dv, left, v0 + dv)
+
+    def on_touch_down(self, touch):
+        """Handler when the raster is touched. Opens the touched component."""
+        if not self.collide_point(touch.x, touch.y) or not self.components:
+            return super(ActivityRaster, self).on_touch_down(touch)
+
+        row = int((self.top - touch.y) / self.height * len(self.components))
+        row = min(max(row, 0), len(self.components) - 1)
+        component = self.components[row]
+        if component in self.manyman.components_list:
+            self.manyman.components_list[component].info.show()
+        return True
@@ -0,0 +1,383 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import deque
+from threading import Condition, Lock, Thread
+import config
+import json
+import logging
+import re
+import socket
+import sys
+import transport
+
+# Logs through kivy's logger when running inside ManyMan.
+Logger = logging.getLogger('kivy.relay')
+
+# Message types of which a viewer only needs the most recent one. Older ones
+# still queued for a slow viewer are dropped.
+latest_wins_msg_types = (
+    'sim_data',
+    'status'
+)
+
+# Message types of which the most recent one is replayed to viewers that
+# connect later on. Relayed statuses are full snapshots, as the relay does not
+# request status deltas.
+cached_msg_types = (
+    'server_init',
+    'selection_set',
+    'status'
+)
+
+# Matches a message that starts with its type
+type_re = re.compile(r'^\s*\{\s*"type"\s*:\s*"(\w+)"')
+
+relay_status_resync = '{"type": "status_resync", "content": {}}\n'
+
+
+def message_type(line):
+    """
+    Determine the type of an encoded message. Only messages that do not
+    start with their type are decoded.
+    """
+    match = type_re.match(line)
+    if match is not None:
+        return match.group(1)
+
+    try:
+        msg = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(msg, dict):
+        return None
+    return msg.get('type')
+
+
+def passive_server_init(line):
+    """
+    Strip the capabilities from a server_init message. Viewers are passive,
+    so they must not subscribe to output or expect status deltas.
+    """
+    msg = json.loads(line)
+    msg['content']['capabilities'] = []
+    return json.dumps(msg)
+
+
+def read_lines(sock, bufsize, callback):
+    """Call 'callback' with every newline-terminated line read from sock."""
+    readbuf = ""
+    while True:
+        data = sock.recv(bufsize)
+        if not data:
+            return
+
+        if '\n' in data:
+            parts = data.split('\n')
+            callback("%s%s" % (readbuf, parts[0]))
+            for part in parts[1:-1]:
+                callback(part)
+            readbuf = parts[-1]
+        else:
+            readbuf += data
+
+
+class Viewer(Thread):
+    """
+    Sender to a single downstream viewer. Messages are queued without
+    blocking, so a slow viewer never holds up the relay or the other
+    viewers; of the latest-wins messages only the newest one is kept. A
+    pending latest-wins message is moved into the queue when another
+    message arrives after it, so the viewer gets them in order.
+    """
+
+    def __init__(self, hub, sock, address, max_queue):
+        self.hub = hub
+        self.sock = sock
+        self.address = address
+        self.max_queue = max_queue
+        self.running = True
+        self.queue = deque()
+        self.slots = dict()
+        self.serial = 0
+        self.dropped = 0
+        self.cond = Condition()
+
+        Thread.__init__(self)
+        self.daemon = True
+
+        self.reader = Thread(target=self.read)
+        self.reader.daemon = True
+
+    def start(self):
+        """Start sending to and reading from the viewer."""
+        Thread.start(self)
+        self.reader.start()
+
+    def put(self, line, msg_type):
+        """Queue an encoded message for the viewer."""
+        self.cond.acquire()
+        try:
+            if msg_type in latest_wins_msg_types:
+                if msg_type in self.slots:
+                    self.dropped += 1
+                self.serial += 1
+                self.slots[msg_type] = (self.serial, line)
+            elif len(self.queue) + len(self.slots) >= self.max_queue:
+                Logger.warning(
+                    "Relay: Viewer %s is too slow; disconnecting" %
+                    self.address
+                )
+                self.running = False
+            else:
+                self.queue.extend(self.take_slots())
+                self.queue.append(line)
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+    def take_slots(self):
+        """Remove the pending latest-wins messages, in order of arrival."""
+        lines = [line for _, line in sorted(self.slots.values())]
+        self.slots.clear()
+        return lines
+
+    def stop(self):
+        """
+        Stop sending to the viewer. Shutting the socket down interrupts a
+        send that is blocked on the viewer.
+        """
+        self.cond.acquire()
+        self.running = False
+        self.cond.notify()
+        self.cond.release()
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+
+    def run(self):
+        """Continuously send the queued messages in as few writes as possible."""
+        try:
+            while True:
+                self.cond.acquire()
+                try:
+                    while self.running and not self.queue and \
+                        not self.slots:
+                        self.cond.wait()
+                    if not self.running:
+                        break
+                    lines = list(self.queue)
+                    lines.extend(self.take_slots())
+                    self.queue.clear()
+                finally:
+                    self.cond.release()
+
+                lines.append("")
+                self.sock.sendall('\n'.join(lines))
+        except Exception, e:
+            Logger.info(
+                "Relay: Could not send to viewer %s: %s" % (self.address, e)
+            )
+
+        self.running = False
+        self.hub.remove(self)
+        self.sock.close()
+
+    def read(self):
+        """
+        Handle the messages of the viewer. Only requests for a full status
+        snapshot are passed on upstream; viewers cannot control the
+        simulator.
+        """
+        try:
+            read_lines(self.sock, 4096, self.handle)
+        except Exception:
+            pass
+        self.stop()
+
+    def handle(self, line):
+        """Handle a single message of the viewer."""
+        msg_type = message_type(line)
+        if msg_type == 'status_resync':
+            self.hub.resync()
+        elif msg_type != 'client_init':
+            Logger.debug("Relay: Ignoring %s message of a viewer" % msg_type)
+
+
+class RelayHub(Thread):
+    """
+    Listener that re-broadcasts the messages of the single upstream
+    connection to any number of local viewers. Every message is broadcast as
+    the encoded line it was received as, so it is never encoded again and the
+    same string is shared by all viewers.
+    """
+
+    def __init__(self, address, resync, max_queue=1000):
+        self.address = address
+        self.resync = resync
+        self.max_queue = max_queue
+        self.running = True
+        self.viewers = []
+        self.cache = dict()
+        self.lock = Lock()
+
+        self.sock = transport.listen(address)
+        Logger.info(
+            "Relay: Listening for viewers on %s" % transport.describe(address)
+        )
+
+        Thread.__init__(self)
+        self.daemon = True
+
+    def run(self):
+        """Continuously accept new viewers."""
+        while self.running:
+            try:
+                sock, address = self.sock.accept()
+            except Exception:
+                break
+
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                name = "%s:%d" % address[:2]
+            else:
+                name = "#%d" % sock.fileno()
+            viewer = Viewer(self, sock, name, self.max_queue)
+            self.lock.acquire()
+            try:
+                # Bring the viewer up to date before it sees any new messages
+                for msg_type in cached_msg_types:
+                    if msg_type in self.cache:
+                        viewer.put(self.cache[msg_type], msg_type)
+                self.viewers.append(viewer)
+            finally:
+                self.lock.release()
+            Logger.info("Relay: Viewer %s connected" % viewer.address)
+            viewer.start()
+
+    def broadcast(self, line):
+        """Queue an encoded message for all viewers."""
+        msg_type = message_type(line)
+        if msg_type == 'server_init':
+            line = passive_server_init(line)
+
+        self.lock.acquire()
+        try:
+            if msg_type in cached_msg_types:
+                self.cache[msg_type] = line
+            for viewer in self.viewers:
+                viewer.put(line, msg_type)
+        finally:
+            self.lock.release()
+
+    def remove(self, viewer):
+        """Forget a disconnected viewer."""
+        self.lock.acquire()
+        try:
+            if viewer in self.viewers:
+                self.viewers.remove(viewer)
+                Logger.info(
+                    "Relay: Viewer %s disconnected, %d frames dropped" %
+                    (viewer.address, viewer.dropped)
+                )
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """Stop accepting viewers and disconnect all viewers."""
+        self.running = False
+        self.sock.close()
+        self.lock.acquire()
+        viewers = list(self.viewers)
+        self.lock.release()
+        for viewer in viewers:
+            viewer.stop()
+
+
+class Relay(object):
+    """
+    Headless relay: holds the upstream connection to the back-end itself and
+    re-broadcasts its messages to the viewers through a RelayHub.
+    """
+
+    def __init__(self, address, listen, max_queue=1000, bufsize=1024):
+        self.address = address
+        self.bufsize = bufsize
+        self.lock = Lock()
+
+        if transport.falls_back(address):
+            Logger.warning(
+                "Relay: Shared memory is slow on a single CPU, using %s "
+                "instead" % transport.describe(address)
+            )
+        self.sock = transport.connect(address)
+        Logger.info("Relay: Connected to the server")
+        self.send(json.dumps({
+            'type': 'client_init',
+            'content': {
+                'name': 'ManyMan relay',
+                'capabilities': []
+            }
+        }) + '\n')
+
+        self.hub = RelayHub(listen, self.request_status_resync, max_queue)
+
+    def send(self, data):
+        """Send encoded data upstream."""
+        self.lock.acquire()
+        try:
+            self.sock.sendall(data)
+        finally:
+            self.lock.release()
+
+    def request_status_resync(self):
+        """Request a full status snapshot from the back-end."""
+        self.send(relay_status_resync)
+
+    def run(self):
+        """Relay all messages until the back-end closes the connection."""
+        self.hub.start()
+        try:
+            read_lines(self.sock, self.bufsize, self.hub.broadcast)
+        finally:
+            Logger.info("Relay: Connection to the server closed")
+            self.hub.close()
+            self.sock.close()
+
+
+def main():
+    """Run a headless relay with the given settings file."""
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+
+    settings = config.Config(file(sys.argv[1] if len(sys.argv) > 1 else
+        'settings.cfg'))
+    relay = Relay(
+        settings['address'],
+        settings.get('relay_listen', ['127.0.0.1', 11112]),
+        settings.get('relay_max_queue', 1000),
+        settings.get('bufsize', 1024)
+    )
+    relay.run()
+
+
+if __name__ == '__main__':
+    main()
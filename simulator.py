@@ -0,0 +1,438 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from alerts import AlertRules
+from communicator import Communicator
+from component import Component
+from delaycontroller import DelayController
+from derived import DerivedMetrics
+from dotdictify import dotdictify
+from frameschema import FrameSchema
+from gantt import PlacementStore
+from kivy.logger import Logger
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+from perfstats import PerfCounters
+from task import CoreTask
+from util import is_prime
+
+
+class Session(object):
+    """
+    Model of a single back-end connection: its chip, selection of vars,
+    components and frame pipeline. The application is the primary session;
+    every additional back-end is a Simulator session.
+    """
+
+    def init_session(self, name, address):
+        """Initialize the state that every connection has of its own."""
+        self.name = name
+        self.address = address
+        self.comm = None
+        self.archive_player = None
+        self.counters = PerfCounters()
+        self.delay_controller = DelayController(self)
+
+        self.chip_name = ""
+        self.chip_cores = ""
+        self.chip_orientation = None
+        self.server_capabilities = set()
+        self.cores = dict()
+        self.tasks = dict()
+        self.placements = PlacementStore()
+
+        self.sample_vars = []
+        self.current_vars = []
+        self.current_vars2 = []
+        self.components_list = dict()
+        self.l1_components_grid_list = dict()
+        self.grid_box = None
+        self.core_grid = None
+
+        self.current_kernel_cycle = 0
+        self.previous_kernel_cycle = 0
+        self.current_delay = None
+        self.frame_schema = FrameSchema([])
+        self.derived_metrics = DerivedMetrics({}, [])
+        self.alert_rules = None
+        self.correlation = None
+        self.correlation_vars = []
+
+        self.status_label = None
+        self.kernel_label = None
+        self.delay_label = None
+        self.step_label = None
+
+    # EDITED
+    def layout_cols(self, ncomponents):
+        """Determine how many colums a GridLayout gets."""
+        elems = ncomponents
+
+        if is_prime(elems) and elems > 2:
+            elems += 1
+
+        rows = 1
+        cols = elems
+
+        for i in xrange(1, elems):
+            if elems % i == 0 and rows < cols:
+                rows = i
+                cols = elems / i
+
+        return cols
+
+    # EDITED
+    def layout_components(self, vars):
+        """Create layout of components from selected vars."""
+        components_dict = dotdictify()
+
+        for i in sorted(vars):
+            components = i.split(":")
+            if components[0] in components_dict:
+                continue
+
+            components_dict[components[0]] = None
+
+        return components_dict
+
+    # EDITED
+    def layout_traverse(self, d, s=""):
+        temp = dict()
+        for k, v in sorted(d.iteritems()):
+            if isinstance(v, dict):
+                rlayout = self.layout_traverse(v, s+k+'.')
+                c = Component(s+k, self, size_hint=(1,0.5))
+                self.components_list[s+k] = c
+                temp_layout = BoxLayout(orientation='vertical')
+                temp_layout.add_widget(c)
+                temp_layout.add_widget(rlayout)
+                temp[k] = temp_layout
+                #print k, s+k
+
+                # Clock.schedule_interval(
+                #     c.update,
+                #     1.0 / self.settings['framerate']
+                # )
+            else:
+                c = Component(s+k, self)
+                self.components_list[s+k] = c
+                temp[k] = c
+                #print k, s+k
+                # Clock.schedule_interval(
+                #     c.update,
+                #     1.0 / self.settings['framerate']
+                # )
+
+        cols = self.layout_cols(len(d))
+
+        layout = GridLayout(cols=cols, spacing=0)
+
+        for k, v in sorted(temp.iteritems()):
+            #print s+":"+k
+            layout.add_widget(v)
+        return layout
+
+    def build_core_grid(self):
+        """Build the core grid and the frame pipeline of the selection."""
+
+        # Derived metrics show up as vars of their own. Archives already
+        # contain the derived vars they were recorded with.
+        metrics = self.settings['derived_metrics']
+        if self.archive_player:
+            metrics = {}
+        self.derived_metrics = DerivedMetrics(metrics, self.sample_vars)
+        sample_vars = self.sample_vars + self.derived_metrics.names
+
+        # Create components structure in a dictionary
+        components_dict = self.layout_components(sample_vars)
+
+        cols = self.layout_cols(len(components_dict))
+        self.core_grid = GridLayout(cols=cols, spacing=10)
+
+        for component1 in sorted(components_dict):
+            layout = BoxLayout(orientation='vertical')
+            c = Component(component1, self, size_hint=(1,0.2))
+            self.components_list[component1] = c
+            layout.add_widget(c)
+            if components_dict[component1] != None:
+                layout.add_widget(self.layout_traverse(components_dict[component1], component1+'.'))
+            self.l1_components_grid_list[component1] = layout
+            self.core_grid.add_widget(layout)
+            # Clock.schedule_interval(
+            #     c.update,
+            #     1.0 / self.settings['framerate']
+            # )
+
+        #popup buttons
+        for k in sample_vars:
+            components = k.split(':')
+            if components[0] in self.components_list:
+                if len(components) < 2:
+                    self.components_list[components[0]].set_data(components[0])
+                elif len(components) > 2:
+                    self.components_list[components[0]].set_data(':'.join(components[1:]))
+                else:
+                    self.components_list[components[0]].set_data(components[1])
+
+        self.frame_schema = FrameSchema(
+            [k for k in sample_vars \
+                if k.split(':')[0] in self.components_list]
+        )
+        self.alert_rules = AlertRules(
+            self,
+            self.settings['alert_rules'],
+            self.frame_schema.full_names()
+        )
+
+    def init_core_grid(self):
+        """(Re)build the core grid of this session in its part of the window."""
+        if self.grid_box is None:
+            self.grid_box = BoxLayout(orientation='vertical', spacing=5)
+            self.build_header()
+            self.app.grids.add_widget(self.grid_box)
+
+        if self.core_grid:
+            self.grid_box.remove_widget(self.core_grid)
+            self.core_grid = None
+
+        if not self.sample_vars:
+            # Not initialized yet
+            return
+
+        self.build_core_grid()
+        self.grid_box.add_widget(self.core_grid)
+
+    def build_header(self):
+        """Add the title of this session when several are shown."""
+        if self.app.simulators:
+            self.grid_box.add_widget(Label(
+                text=self.name,
+                size_hint_y=None,
+                height=20
+            ))
+
+    def reference_component(self, index):
+        """Retrieve the component this session's component is compared to."""
+        return None
+
+    @property
+    def backend(self):
+        """
+        The back-end the controls of this session go to: the archive player
+        when browsing an archive, the communicator otherwise.
+        """
+        return self.archive_player or self.comm
+
+    def pause_session(self):
+        """Pause the back-end of this session only, as alerts do."""
+        if self.backend:
+            self.backend.pause_sim()
+
+    def init_correlation(self):
+        """Start a new correlation window. Only the primary session has one."""
+        pass
+
+    def toggle_correlation_var(self, name):
+        """Pin the var with given name for correlation, or unpin it."""
+        if name in self.correlation_vars:
+            self.correlation_vars.remove(name)
+        else:
+            self.correlation_vars.append(name)
+        self.init_correlation()
+
+    def deselect_task(self, t):
+        """Remove the given task from the task selection, if any."""
+        pass
+
+    def has_task(self, tid):
+        """Determine whether the task with given id is shown."""
+        return tid in self.tasks
+
+    def add_task(self, tid, name, core, status):
+        """
+        Add a task reported by the back-end. Only tasks on a core of the grid
+        are shown; returns the task, or None when it is not shown.
+        """
+        if not core in self.cores:
+            return None
+
+        Logger.debug("Session: Adding task %s on core %d" % (tid, core))
+        t = CoreTask(name, tid, self.cores[core], status)
+        self.tasks[tid] = t
+        self.cores[core].add_task(t)
+        return t
+
+    def move_task(self, t, core=None):
+        """Move a task to the given core, or off its core when none given."""
+        if t.core:
+            t.core.remove_task(t)
+        if core:
+            core.add_task(t)
+        t.core = core
+
+    def finish_task(self, tid, status):
+        """Mark a task as finished or failed, freeing its core."""
+        t = self.tasks[tid]
+        t.status = status
+        if t.core:
+            t.core.remove_task(t)
+
+    def remove_task(self, tid):
+        """Remove a task that the back-end no longer reports."""
+        t = self.tasks.pop(tid, None)
+        if not t:
+            return
+
+        if t.core:
+            t.core.remove_task(t)
+        self.deselect_task(t)
+
+    def extend_frame(self, names, values):
+        """
+        Prepare a frame for the frame array: leave out the non-numeric vars,
+        such as status strings, and add the derived metrics.
+        """
+        names, values = self.frame_schema.numeric(names, values)
+        if self.derived_metrics:
+            names, values = self.derived_metrics.extend(names, values)
+        return names, values
+
+    def archive_frame(self, cycle, names, values):
+        """
+        Store a frame in the archive without applying it, as for the frames
+        that are dropped when the front-end can not keep up.
+        """
+        if self.archive_writer:
+            names, values = self.extend_frame(names, values)
+            self.archive_writer.append_frame(cycle, names, values)
+
+    def apply_frame(self, cycle, names, values):
+        """
+        Apply a frame of sampled values, given in the order of 'names', that
+        was taken at the given kernel cycle, and archive it.
+        """
+        self.previous_kernel_cycle = self.current_kernel_cycle
+        self.current_kernel_cycle = cycle
+        self.kernel_label.text = "kernel cycle\n\n%d" % cycle
+
+        names, values = self.extend_frame(names, values)
+        if self.archive_writer:
+            self.archive_writer.append_frame(cycle, names, values)
+
+        # Determine the rates and changes of all vars at once, and hand the
+        # results to the components in bulk
+        values, rates, changed = self.frame_schema.update(
+            names,
+            values,
+            self.current_kernel_cycle - self.previous_kernel_cycle
+        )
+
+        for component, start, end in self.frame_schema.components:
+            if component in self.components_list:
+                self.components_list[component].update_frame(
+                    self.frame_schema.vars[start:end],
+                    values[start:end],
+                    rates[start:end],
+                    changed[start:end],
+                    self.frame_schema.integral[start:end]
+                )
+
+        if self.alert_rules:
+            self.alert_rules.update(values, rates)
+
+        if self.correlation:
+            self.correlation.add(rates)
+
+        if self.activity_raster:
+            self.activity_raster.add(changed)
+
+
+class Simulator(Session):
+    """
+    Session of an additional back-end. Has a connection of its own, with its
+    own receiving, sending and decoding threads and its own message queue,
+    so a slow simulator does not hold up the others. Only the settings, the
+    JSON codec, the decode workers and the state of the window are taken
+    from the application; all actions go to the simulator's own back-end.
+    """
+
+    def __init__(self, app, name, address):
+        self.app = app
+        self.settings = app.settings
+        self.codec = app.codec
+        self.decode_pool = app.decode_pool
+        self.init_session(name, address)
+
+        # The application-wide views follow the primary session only
+        self.archive_writer = None
+        self.leaderboard = None
+        self.activity_raster = None
+
+        # Status of the simulator, shown above its grid
+        self.status_label = Label(text="simulator status\n\n-")
+        self.kernel_label = Label(text="kernel cycle\n\n0000")
+        self.delay_label = Label(text="current send delay\n\n0000")
+        self.step_label = Label(text="current steps\n\n0000")
+
+    @property
+    def started(self):
+        """Whether the application has started."""
+        return self.app.started
+
+    @property
+    def diff_view(self):
+        """Whether the grid is shown as its difference with the primary."""
+        return self.app.diff_view
+
+    def connect(self):
+        """
+        Connect to the back-end. The connection is made on the communicator's
+        thread, and the back-end's grid is built once it is initialized, so
+        an unreachable simulator does not hold up start-up or the others.
+        """
+        try:
+            self.comm = Communicator(self, connect=False)
+            self.comm.start()
+        except Exception, e:
+            Logger.error("Simulator: Could not connect to %s: %s" %
+                (self.name, e))
+            self.comm = None
+
+    def close(self):
+        """Close the connection to the back-end."""
+        if self.comm:
+            self.comm.close()
+            self.comm.join()
+
+    def build_header(self):
+        """Add the title and the simulator status of this session."""
+        Session.build_header(self)
+
+        header = BoxLayout(size_hint_y=None, height=40)
+        header.add_widget(self.status_label)
+        header.add_widget(self.kernel_label)
+        header.add_widget(self.delay_label)
+        header.add_widget(self.step_label)
+        self.grid_box.add_widget(header)
+
+    def reference_component(self, index):
+        """Retrieve the component of the primary session with given index."""
+        return self.app.components_list.get(index)
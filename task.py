@@ -28,8 +28,7 @@ from kivy.uix.image import Image
 from kivy.uix.label import Label
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.widget import Widget
-from os import mkdir
-from os.path import isdir
+from outputring import OutputRing
 from perfgraph import PerfGraph
 from time import strftime
 from widgets import ImageButton
@@ -49,11 +48,19 @@ class Task(Widget):
 
         self.grabbable = True
         self.coll_core = None
+        self._selected = False
 
         super(Task, self).__init__(**kwargs)
 
         self.build()
 
+    def connected(self):
+        """
+        Determine whether the task can be controlled. There is no back-end
+        to control while browsing an archive.
+        """
+        return self.manyman.comm is not None
+
     def build(self):
         """Render this task object."""
         with self.canvas:
@@ -87,6 +94,11 @@ class Task(Widget):
         if not self.collide_point(x, y) or not self.grabbable:
             return False
 
+        if touch.is_double_tap:
+            # Add the task to or remove it from the multi-selection
+            self.manyman.toggle_task_selection(self)
+            return True
+
         # Make sure a task object can not be touched multiple times at once
         self.grabbable = False
         touch.grab(self)
@@ -198,8 +210,23 @@ class Task(Widget):
         self.c.a = .7
         self.r.pos = self.r.pos
 
+    def get_selected(self):
+        """Getter for the selection state of this task."""
+        return self._selected
+
+    def set_selected(self, value):
+        """Setter for the selection state. Selected tasks are paler."""
+        self._selected = value
+        if value:
+            self.c.s = .4
+            self.c.a = .9
+        else:
+            self.c.s = 1
+            self.c.a = .7
+
     # Define getters and setters
     hue = property(get_hue, set_hue)
+    selected = property(get_selected, set_selected)
 
 
 class PendingTask(Task):
@@ -264,6 +291,8 @@ class PendingTask(Task):
     def on_touch_down(self, touch):
         """Handler when a task is touched. Checks for button touches first."""
         x, y = touch.x, touch.y
+        if not self.connected():
+            return super(PendingTask, self).on_touch_down(touch)
         if self.dup_button.collide_point(x, y):
             # Duplicate the task
             self.dup_button.color = (.9, .6, 0, 1)
@@ -314,18 +343,27 @@ class PendingTask(Task):
         if not super(PendingTask, self).on_touch_up(touch):
             return False
 
-        if self.coll_core:
-            if self.is_new():
-                self.manyman.comm.start_task(
-                    self.name,
-                    self.command,
-                    self.coll_core.index
-                )
-            else:
-                self.manyman.comm.move_task(self, self.coll_core.index)
+        if self.coll_core and self.connected():
+            # Start all selected tasks along with this one
+            tasks = self.manyman.task_group(self)
+            self.manyman.comm.start_batch()
+            for t in tasks:
+                if t.is_new():
+                    self.manyman.comm.start_task(
+                        t.name,
+                        t.command,
+                        self.coll_core.index
+                    )
+                else:
+                    self.manyman.comm.move_task(t, self.coll_core.index)
+            self.manyman.comm.send_batch()
+            self.manyman.clear_task_selection()
+
             self.center = self.from_pos
             self.coll_core = None
-            self.parent.remove_widget(self)
+            for t in tasks:
+                if t.parent:
+                    t.parent.remove_widget(t)
 
         return True
 
@@ -346,6 +384,7 @@ class CoreTask(Task):
 
         self.info_built = False
         self.info_showing = False
+        self.subscribed = False
 
         self.info_button = None
         self.label = None
@@ -357,12 +396,23 @@ class CoreTask(Task):
         self.scroll = None
 
         self._outfile = None
-        self._out = []
+        self._out = None
+        self.view_start = 0
+        self.view_end = 0
         self._cpu = 0.0
         self._mem = 0.0
 
         super(CoreTask, self).__init__(name, core.manyman, **kwargs)
 
+        outfile = None
+        if self.manyman.settings['output_to_file']:
+            outfile = self.outfile
+        self._out = OutputRing(
+            self.manyman.settings['output_ring_size'],
+            outfile,
+            self.manyman.output_writer
+        )
+
         self._build()
 
     def _build(self):
@@ -459,10 +509,9 @@ class CoreTask(Task):
             size_hint=(None, None),
             valign='top'
         )
-        if len(self._out) > 0:
-            self.set_output(self._out)
         self.output.bind(texture_size=self.output.setter('size'))
         self.scroll.add_widget(self.output)
+        self.scroll.bind(scroll_y=self.output_scrolled)
 
         sidebar.add_widget(self.scroll)
         layout.add_widget(sidebar)
@@ -512,73 +561,161 @@ class CoreTask(Task):
             # Render the popup if not done yet
             self.build_info()
         self.info_showing = True
+        self.show_output()
 
-        # Request the task output every second
-        Clock.schedule_interval(self.request_output, 1.0)
+        if 'output_push' in self.manyman.server_capabilities:
+            # Let the back-end push new output while the popup is open
+            self.subscribe_output()
+        else:
+            # Request the task output every second
+            Clock.schedule_interval(self.request_output, 1.0)
 
     def info_dismiss(self, *largs):
         """Handler when the detailed task info popup is closed."""
         Logger.debug("CoreTask: Hiding info")
         self.info_showing = False
 
-        # Stop requesting for output
+        # Stop receiving output
+        self.unsubscribe_output()
         Clock.unschedule(self.request_output)
 
+    def subscribe_output(self):
+        """Subscribe to the output of the task."""
+        if self.subscribed or not self.connected():
+            return
+
+        self.subscribed = True
+        self.manyman.comm.subscribe_output(
+            self.tid,
+            len(self._out),
+            self.manyman.settings['output_push_window']
+        )
+
+    def unsubscribe_output(self):
+        """Unsubscribe from the output of the task."""
+        if not self.subscribed or not self.connected():
+            return
+
+        self.subscribed = False
+        self.manyman.comm.unsubscribe_output(self.tid)
+
     def request_output(self, *largs):
         """Request the output of the task."""
+        if not self.connected():
+            return
         self.manyman.comm.request_output(self.tid, len(self._out))
 
     def stop(self, *largs):
-        """Stop the task."""
-        Logger.debug("CoreTask: Stopping task %s" % self.tid)
-        self.manyman.comm.move_task(self, -1)
-        self.unbind_all_buttons()
+        """Stop the task, along with all other selected tasks."""
+        if not self.connected():
+            return
+        tasks = self.manyman.task_group(self)
+        Logger.debug("CoreTask: Stopping %d task(s)" % len(tasks))
+        self.manyman.comm.move_tasks(tasks, -1)
+        self.finish_action(tasks)
 
     def pause(self, *largs):
-        """Pause the task."""
-        Logger.debug("CoreTask: Pausing task %s" % self.tid)
-        self.manyman.comm.pause_task(self.tid)
-        self.unbind_all_buttons()
+        """Pause the task, along with all other selected tasks."""
+        if not self.connected():
+            return
+        tasks = self.manyman.task_group(self)
+        Logger.debug("CoreTask: Pausing %d task(s)" % len(tasks))
+        self.manyman.comm.pause_tasks([t.tid for t in tasks])
+        self.finish_action(tasks)
 
     def resume(self, *largs):
-        """Resume the task."""
-        Logger.debug("CoreTask: Resuming task %s" % self.tid)
-        self.manyman.comm.resume_task(self.tid)
-        self.unbind_all_buttons()
+        """Resume the task, along with all other selected tasks."""
+        if not self.connected():
+            return
+        tasks = self.manyman.task_group(self)
+        Logger.debug("CoreTask: Resuming %d task(s)" % len(tasks))
+        self.manyman.comm.resume_tasks([t.tid for t in tasks])
+        self.finish_action(tasks)
 
     def move(self, *largs):
-        """Smart-move the task"""
-        Logger.debug("CoreTask: Smart-moving task %s" % self.tid)
-        self.manyman.comm.move_task(self)
-        self.unbind_all_buttons()
+        """Smart-move the task, along with all other selected tasks."""
+        if not self.connected():
+            return
+        tasks = self.manyman.task_group(self)
+        Logger.debug("CoreTask: Smart-moving %d task(s)" % len(tasks))
+        self.manyman.comm.move_tasks(tasks)
+        self.finish_action(tasks)
+
+    def finish_action(self, tasks):
+        """Unbind the buttons of the given tasks and clear the selection."""
+        for t in tasks:
+            t.unbind_all_buttons()
+        self.manyman.clear_task_selection()
 
     def set_output(self, output):
         """Append the new output to the previous output."""
-        self._out += output
+        following = self.view_end == len(self._out)
+        self._out.append(output)
 
         if self.manyman.settings['output_to_file']:
             # Write output to a file
-            if not isdir(self.manyman.settings['output_folder']):
-                mkdir(self.manyman.settings['output_folder'])
-            f = open(self.outfile, "a")
-            f.write("".join(output))
-            f.close()
-
-        if not self.info_showing:
-            # Do not render output when the info popup is hidden
+            self.manyman.output_writer.write(self.outfile, "".join(output))
+
+        if not self.info_showing or not following:
+            # Do not render output when the info popup is hidden or when
+            # older output is being browsed
             return
 
         # Determine if the output window should scroll down or not
         scroll_down = self.scroll.scroll_y == 0 or \
             self.output.text == NO_OUTPUT_TEXT
 
-        # Show the last lines of the output
-        self.output.text = "".join(
-            self._out[-self.manyman.settings['output_buffer_size']:]
-        )
+        # Show the last lines of the output. The shown output may grow to
+        # twice the buffer size before it is trimmed, so that the output
+        # text only has to be rebuilt once in a while.
+        buffer_size = self.manyman.settings['output_buffer_size']
+        self.view_end = len(self._out)
+        if self.view_end - self.view_start > 2 * buffer_size or \
+            self.output.text == NO_OUTPUT_TEXT:
+            self.view_start = max(0, self.view_end - buffer_size)
+            self.render_output()
+        else:
+            self.output.text += "".join(output)
         if scroll_down:
             self.scroll.scroll_y = 0
 
+    def show_output(self):
+        """Show the last lines of the output and follow new output."""
+        self.view_end = len(self._out)
+        self.view_start = max(
+            0,
+            self.view_end - self.manyman.settings['output_buffer_size']
+        )
+        self.render_output()
+        self.scroll.scroll_y = 0
+
+    def render_output(self):
+        """Render the output between view_start and view_end."""
+        text = self._out.read(self.view_start, self.view_end)
+        self.output.text = text or NO_OUTPUT_TEXT
+
+    def output_scrolled(self, instance, value):
+        """
+        Handler when the output is scrolled. Pages older output in from disk
+        at the top, and newer output back in at the bottom.
+        """
+        page = self.manyman.settings['output_page_size']
+        max_size = 2 * self.manyman.settings['output_buffer_size']
+
+        if value >= 1 and self.view_start > 0:
+            self.view_start = max(0, self.view_start - page)
+            self.view_end = min(self.view_end, self.view_start + max_size)
+            self.render_output()
+            self.scroll.scroll_y = \
+                1. - float(page) / max(1, self.view_end - self.view_start)
+        elif value <= 0 and self.view_end < len(self._out):
+            self.view_end = min(len(self._out), self.view_end + page)
+            self.view_start = max(self.view_start, self.view_end - max_size)
+            self.render_output()
+            if self.view_end < len(self._out):
+                self.scroll.scroll_y = \
+                    float(page) / max(1, self.view_end - self.view_start)
+
     def on_touch_down(self, touch):
         """Handler when a task is touched. Checks for button presses first."""
         x, y = touch.x, touch.y
@@ -620,14 +757,18 @@ class CoreTask(Task):
         if not super(CoreTask, self).on_touch_up(touch):
             return False
 
-        if not self.status == "Running":
+        if not self.status == "Running" or not self.connected():
             return False
 
+        # Move all selected running tasks along with this one
+        tasks = [t for t in self.manyman.task_group(self) \
+            if t.status == "Running"]
         if self.coll_core:
-            self.manyman.comm.move_task(self, self.coll_core.index)
+            self.manyman.comm.move_tasks(tasks, self.coll_core.index)
             self.coll_core = None
         else:
-            self.manyman.comm.move_task(self, -1)
+            self.manyman.comm.move_tasks(tasks, -1)
+        self.manyman.clear_task_selection()
 
         return True
 
@@ -664,6 +805,11 @@ class CoreTask(Task):
         self._status = value
         self.label.text = '%s\nStatus: %s' % (self.name, value)
         self.update_title()
+
+        if value in ["Finished", "Failed"] and self._outfile:
+            # No more output will follow
+            self.manyman.output_writer.close(self._outfile)
+
         if not self.info_built:
             return
 
@@ -680,6 +826,8 @@ class CoreTask(Task):
 
         elif value == "Finished":
             Clock.unschedule(self.request_output)
+            self.unsubscribe_output()
+            self.manyman.deselect_task(self)
 
     def get_cpu(self):
         """Getter for the current CPU usage."""
@@ -0,0 +1,65 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from frameschema import FrameSchema
+
+
+class FrameSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = FrameSchema(['cpu0:busy', 'cpu0:state', 'cpu1:ipc'])
+
+    def test_string_var(self):
+        names = ['cpu0:busy', 'cpu0:state', 'cpu1:ipc']
+        values, rates, changed = self.schema.update(
+            names, [10, 'running', 0.5], 0
+        )
+        self.assertEqual(list(values), [10, 0, 0.5])
+
+        values, rates, changed = self.schema.update(
+            names, [14, 'halted', 0.5], 2
+        )
+        self.assertEqual(list(values), [14, 0, 0.5])
+        self.assertEqual(list(rates), [2, 0, 0])
+        self.assertEqual(list(changed), [True, False, False])
+
+    def test_missing_var(self):
+        self.schema.update(['cpu0:busy', 'cpu1:ipc'], [10, 0.5], 0)
+        values, rates, changed = self.schema.update(['cpu0:busy'], [12], 1)
+        self.assertEqual(list(values), [12, 0, 0.5])
+
+    def test_integral(self):
+        names = ['cpu0:busy', 'cpu1:ipc']
+        self.schema.update(names, [10, 1.0], 0)
+        self.assertEqual(list(self.schema.integral), [True, True, True])
+
+        self.schema.update(names, [11, 1.5], 1)
+        self.schema.update(names, [12, 2.0], 1)
+        self.assertEqual(list(self.schema.integral), [True, True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from bisect import bisect_right
+from numbers import Integral, Real
+from operator import add
+
+
+# Resolutions of the rollups, in raw samples per bucket
+ROLLUP_FACTORS = (16, 256)
+
+
+class Level(object):
+    """
+    Samples of a series at a single resolution. Every bucket holds the
+    minimum, maximum and sum of 'factor' consecutive samples. When a capacity
+    is given, only (about) the most recent 'capacity' buckets are kept; a
+    merging level instead keeps all samples, and merges every two adjacent
+    buckets whenever it holds twice its capacity, doubling its factor.
+    """
+
+    def __init__(self, factor, capacity=None, merge=False):
+        self.factor = factor
+        self.capacity = capacity
+        self.merge = merge
+
+        self.mins = array('d')
+        if factor == 1:
+            # Buckets of a single sample need only one array
+            self.maxs = self.sums = self.mins
+        else:
+            self.maxs = array('d')
+            self.sums = array('d')
+
+        # Number of buckets dropped from the front, and number of samples in
+        # the last bucket
+        self.dropped = 0
+        self.fill = 0
+
+    def __len__(self):
+        return len(self.mins)
+
+    def append(self, value):
+        """Add a sample to the last bucket, or start a new bucket."""
+        if self.factor == 1:
+            self.mins.append(value)
+        elif self.fill == 0 or self.fill == self.factor:
+            self.mins.append(value)
+            self.maxs.append(value)
+            self.sums.append(value)
+            self.fill = 0
+        else:
+            if value < self.mins[-1]:
+                self.mins[-1] = value
+            if value > self.maxs[-1]:
+                self.maxs[-1] = value
+            self.sums[-1] += value
+        self.fill += 1
+
+        if self.capacity and len(self.mins) >= 2 * self.capacity:
+            if self.merge:
+                self.compact()
+                return
+
+            # Drop the oldest buckets in one go, so that trimming costs
+            # constant time per sample on average
+            n = len(self.mins) - self.capacity
+            del self.mins[:n]
+            if self.factor != 1:
+                del self.maxs[:n]
+                del self.sums[:n]
+            self.dropped += n
+
+    def compact(self):
+        """
+        Halve the number of buckets by merging every two adjacent ones. Only
+        for levels with a factor above 1, as those have separate arrays.
+        """
+        n = len(self.mins) // 2 * 2
+        mins = array('d', map(min, self.mins[0:n:2], self.mins[1:n:2]))
+        maxs = array('d', map(max, self.maxs[0:n:2], self.maxs[1:n:2]))
+        sums = array('d', map(add, self.sums[0:n:2], self.sums[1:n:2]))
+        if n < len(self.mins):
+            # The last bucket has no partner; it is the first part of a
+            # bucket of the new factor
+            mins.append(self.mins[-1])
+            maxs.append(self.maxs[-1])
+            sums.append(self.sums[-1])
+        else:
+            self.fill += self.factor
+
+        self.mins, self.maxs, self.sums = mins, maxs, sums
+        self.factor *= 2
+
+    def means(self, start=0, end=None):
+        """Retrieve the means of the buckets from 'start' up to 'end'."""
+        if end is None:
+            end = len(self.sums)
+        if self.factor == 1:
+            return self.sums[start:end].tolist()
+
+        f = float(self.factor)
+        means = [s / f for s in self.sums[start:end]]
+        if means and end >= len(self.sums):
+            # The last bucket may not be full yet
+            means[-1] = self.sums[-1] / self.fill
+        return means
+
+
+class TimeSeries(object):
+    """
+    Append-only series of samples. Besides a bounded window of raw samples,
+    rollups at coarser resolutions are maintained on every append. The
+    coarsest rollup covers the whole series, so the entire history can be
+    shown without touching every raw sample; it halves its resolution
+    whenever it outgrows the capacity, so a series takes bounded memory.
+    """
+
+    def __init__(self, capacity, factors=ROLLUP_FACTORS):
+        self.count = 0
+        self.levels = [Level(1, capacity)]
+        for factor in factors[:-1]:
+            self.levels.append(Level(factor, capacity))
+        self.levels.append(Level(factors[-1], capacity, merge=True))
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        """Append a sample to the series and all of its rollups."""
+        self.count += 1
+        for level in self.levels:
+            level.append(value)
+
+    def raw(self):
+        """Retrieve the level containing the raw samples."""
+        return self.levels[0]
+
+    def overview(self, buckets):
+        """
+        Retrieve the finest level that covers the whole series in at most
+        the given number of buckets. If no level is that coarse, the
+        coarsest level that covers the whole series is returned.
+        """
+        covering = [l for l in self.levels if l.dropped == 0]
+        for level in covering:
+            if len(level) <= buckets:
+                return level
+        return covering[-1]
+
+
+class CycleHistory(object):
+    """
+    History of a var, tagged with kernel cycles. Only the samples at which
+    the value changed are stored, in cycle order, so the value at any cycle
+    is the value of the last change at or before it. All queries are binary
+    searches over the cycle array. Non-numeric values are not stored, and
+    values are returned as integers as long as the var is integral.
+    When a capacity is given, only (about) the most recent 'capacity' changes
+    are kept.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.cycles = array('d')
+        self.values = array('d')
+        self.integral = True
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def append(self, cycle, value, integral=None):
+        """
+        Store a sample, if the value differs from the last stored one.
+        'integral' tells whether the var only took whole numbers so far, as
+        tracked by the frame schema; by default, the type of the values
+        decides.
+        """
+        if not isinstance(value, Real):
+            return
+        if integral is None:
+            integral = self.integral and isinstance(value, Integral)
+        self.integral = integral
+
+        if self.values and self.values[-1] == value:
+            return
+        self.cycles.append(cycle)
+        self.values.append(value)
+
+        if self.capacity and len(self.cycles) >= 2 * self.capacity:
+            # Drop the oldest changes in one go, as in Level
+            n = len(self.cycles) - self.capacity
+            del self.cycles[:n]
+            del self.values[:n]
+            self.dropped += n
+
+    def pairs(self, start, end):
+        """Retrieve the stored (cycle, value) pairs from 'start' to 'end'."""
+        if self.integral:
+            return [(c, int(v)) for c, v in
+                    zip(self.cycles[start:end], self.values[start:end])]
+        return zip(self.cycles[start:end], self.values[start:end])
+
+    def last(self, n):
+        """Retrieve the last 'n' changes as (cycle, value) pairs."""
+        return self.pairs(max(0, len(self.cycles) - n), len(self.cycles))
+
+    def value_at(self, cycle):
+        """
+        Retrieve the value at the given cycle, or None if not sampled yet or
+        no longer kept.
+        """
+        i = bisect_right(self.cycles, cycle) - 1
+        if i < 0:
+            return None
+        return self.pairs(i, i + 1)[0][1]
+
+    def between(self, start, end):
+        """
+        Retrieve the (cycle, value) pairs in effect from cycle 'start' up to
+        and including cycle 'end': the value at 'start' followed by all
+        changes after it.
+        """
+        lo = bisect_right(self.cycles, start)
+        hi = bisect_right(self.cycles, end)
+        result = self.pairs(lo, hi)
+        if lo > 0:
+            result.insert(0, (start, self.pairs(lo - 1, lo)[0][1]))
+        return result
+
+    def first_change_after(self, cycle):
+        """
+        Retrieve the (cycle, value) pair of the first change after the given
+        cycle, or None if the value did not change since.
+        """
+        i = bisect_right(self.cycles, cycle)
+        if i == 0 and not self.dropped:
+            # The first sample is not a change
+            i = 1
+        if i >= len(self.cycles):
+            return None
+        return self.pairs(i, i + 1)[0]
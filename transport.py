@@ -0,0 +1,342 @@
+"""
+ManyMan - A Many-core Visualization and Management System
+Copyright (C) 2012
+University of Amsterdam - Computer Systems Architecture
+Jimi van der Woning and Roy Bakker
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from multiprocessing import cpu_count
+from threading import Condition
+from time import sleep
+import mmap
+import os
+import socket
+import struct
+
+# Layout of the header of a shared-memory ring: magic, capacity, the number
+# of bytes ever written (head), the number of bytes ever read (tail) and a
+# closed flag. Each counter is only written by one side.
+SHM_MAGIC = 0x4d4d52494e47
+SHM_HEADER = struct.Struct('<QQQQQ')
+SHM_HEAD_OFFSET = 16
+SHM_TAIL_OFFSET = 24
+SHM_CLOSED_OFFSET = 32
+SHM_DATA_OFFSET = 64
+SHM_CAPACITY = 1 << 22
+
+# Polling of an empty or full ring: first poll this many times, then sleep,
+# doubling the sleep up to shm_max_sleep while the ring stays idle. Polling
+# only pays off when the other side runs on another CPU; on a single CPU the
+# rings are slower than a socket, so shm addresses fall back to one there.
+shm_usable = cpu_count() > 1
+shm_spins = 200
+shm_sleep = 0.0002
+shm_max_sleep = 0.01
+
+counter = struct.Struct('<Q')
+
+
+def parse_address(address):
+    """
+    Determine the transport named by an address setting. Returns the
+    transport ('tcp', 'unix' or 'shm') and its address:
+
+        ['host', port]            TCP
+        'unix:/path' or '/path'   Unix-domain socket
+        'shm:/dev/shm/name'       Shared-memory rings
+
+    Shared memory is only for hosts with more than one CPU; see resolve.
+    """
+    if isinstance(address, basestring):
+        if address.startswith('shm:'):
+            return 'shm', address[4:]
+        if address.startswith('unix:'):
+            return 'unix', address[5:]
+        return 'unix', address
+    return 'tcp', (address[0], int(address[1]))
+
+
+def resolve(address):
+    """
+    Determine the transport actually used for an address setting. On a host
+    with a single CPU, a shared-memory address falls back to the Unix-domain
+    socket '/dev/shm/name.sock', which both sides then use instead.
+    """
+    transport, where = parse_address(address)
+    if transport == 'shm' and not shm_usable:
+        return 'unix', "%s.sock" % where
+    return transport, where
+
+
+def falls_back(address):
+    """Determine whether a shared-memory address falls back to a socket."""
+    return resolve(address) != parse_address(address)
+
+
+def describe(address):
+    """Describe an address setting for display."""
+    transport, where = resolve(address)
+    if transport == 'tcp':
+        return "%s:%d" % where
+    return "%s:%s" % (transport, where)
+
+
+def connect(address, timeout=None):
+    """
+    Connect to the given address, giving up after 'timeout' seconds. Returns
+    a socket, or an object with the same recv, sendall, shutdown and close
+    methods.
+    """
+    transport, where = resolve(address)
+    if transport == 'shm':
+        return ShmSocket(
+            ShmRing("%s-down" % where),
+            ShmRing("%s-up" % where)
+        )
+
+    if transport == 'tcp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(where)
+    sock.settimeout(None)
+    return sock
+
+
+def listen(address, backlog=5):
+    """
+    Create a socket listening on the given address. Shared-memory rings
+    connect a single pair of processes, so they cannot be listened on; see
+    listen_shm. A shared-memory address that falls back to a socket is
+    listened on like any other socket.
+    """
+    transport, where = resolve(address)
+    if transport == 'shm':
+        raise ValueError("Cannot listen on shared memory: %s" % address)
+
+    if transport == 'tcp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(where):
+            os.unlink(where)
+    sock.bind(where)
+    sock.listen(backlog)
+    return sock
+
+
+def listen_shm(address, capacity=SHM_CAPACITY):
+    """
+    Create the rings of a shared-memory address, as the back-end does.
+    Returns the back-end's end of the connection. Addresses that fall back
+    to a socket have to be listened on with listen instead.
+    """
+    transport, where = resolve(address)
+    if transport != 'shm':
+        raise ValueError("Not a shared-memory address on this host: %s" %
+                         address)
+    return ShmSocket(
+        ShmRing("%s-up" % where, capacity),
+        ShmRing("%s-down" % where, capacity)
+    )
+
+
+def shm_wait(spins):
+    """Wait for the other side of a ring after 'spins' unsuccessful polls."""
+    if spins < shm_spins:
+        sleep(0)
+    else:
+        sleep(min(shm_sleep * (1 << min(spins - shm_spins, 16)),
+                  shm_max_sleep))
+
+
+class ShmRing(object):
+    """
+    Single-producer single-consumer byte ring in a memory-mapped file. Data
+    is copied straight from the writer's string into the mapping and from
+    the mapping into the reader's string, without any system calls or
+    copies through the kernel. A capacity creates the ring; without one an
+    existing ring is opened.
+    """
+
+    def __init__(self, path, capacity=None):
+        self.path = path
+
+        if capacity is not None:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0600)
+            os.ftruncate(fd, SHM_DATA_OFFSET + capacity)
+        else:
+            fd = os.open(path, os.O_RDWR)
+        try:
+            self.map = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+        if capacity is not None:
+            SHM_HEADER.pack_into(self.map, 0, SHM_MAGIC, capacity, 0, 0, 0)
+
+        magic, self.capacity = SHM_HEADER.unpack_from(self.map, 0)[:2]
+        if magic != SHM_MAGIC:
+            self.map.close()
+            raise IOError("Not a shared-memory ring: %s" % path)
+
+    def get(self, offset):
+        """Read one of the counters of the header."""
+        return counter.unpack_from(self.map, offset)[0]
+
+    def set(self, offset, value):
+        """
+        Write one of the counters of the header. The counter is copied in
+        at once; pack_into clears it first, which the other side could
+        observe.
+        """
+        self.map[offset:offset + counter.size] = counter.pack(value)
+
+    def closed(self):
+        """Determine whether either side closed the ring."""
+        return self.get(SHM_CLOSED_OFFSET) != 0
+
+    def write(self, data):
+        """Write all of the given data, waiting while the ring is full."""
+        head = self.get(SHM_HEAD_OFFSET)
+        done = 0
+        spins = 0
+        while done < len(data):
+            if self.closed():
+                raise IOError("Shared-memory ring closed: %s" % self.path)
+
+            free = self.capacity - (head - self.get(SHM_TAIL_OFFSET))
+            if free == 0:
+                shm_wait(spins)
+                spins += 1
+                continue
+
+            n = min(free, len(data) - done)
+            start = head % self.capacity
+            first = min(n, self.capacity - start)
+            pos = SHM_DATA_OFFSET + start
+            self.map[pos:pos + first] = data[done:done + first]
+            if first < n:
+                # Wrap around to the start of the ring
+                self.map[SHM_DATA_OFFSET:SHM_DATA_OFFSET + n - first] = \
+                    data[done + first:done + n]
+
+            # Publish the data only once it has been copied
+            head += n
+            self.set(SHM_HEAD_OFFSET, head)
+            done += n
+            spins = 0
+
+    def read(self, bufsize):
+        """
+        Read at most 'bufsize' bytes, waiting while the ring is empty.
+        Returns an empty string once the ring is closed and drained.
+        """
+        tail = self.get(SHM_TAIL_OFFSET)
+        spins = 0
+        while True:
+            available = self.get(SHM_HEAD_OFFSET) - tail
+            if available:
+                break
+            if self.closed():
+                return ""
+            shm_wait(spins)
+            spins += 1
+
+        n = min(available, bufsize)
+        start = tail % self.capacity
+        first = min(n, self.capacity - start)
+        pos = SHM_DATA_OFFSET + start
+        data = self.map[pos:pos + first]
+        if first < n:
+            data += self.map[SHM_DATA_OFFSET:SHM_DATA_OFFSET + n - first]
+
+        self.set(SHM_TAIL_OFFSET, tail + n)
+        return data
+
+    def close(self):
+        """Mark the ring closed for both sides and unmap it."""
+        self.set(SHM_CLOSED_OFFSET, 1)
+        self.map.close()
+
+
+class ShmSocket(object):
+    """
+    Connection over a pair of shared-memory rings, with the methods of a
+    socket that the front-end uses.
+    """
+
+    def __init__(self, incoming, outgoing):
+        self.incoming = incoming
+        self.outgoing = outgoing
+        self.open = True
+        self.users = 0
+        self.cond = Condition()
+
+    def enter(self):
+        """Register a thread using the rings; False when already closed."""
+        with self.cond:
+            if not self.open:
+                return False
+            self.users += 1
+            return True
+
+    def leave(self):
+        """Unregister a thread using the rings."""
+        with self.cond:
+            self.users -= 1
+            self.cond.notify_all()
+
+    def recv(self, bufsize):
+        """Receive at most 'bufsize' bytes."""
+        if not self.enter():
+            return ""
+        try:
+            return self.incoming.read(bufsize)
+        finally:
+            self.leave()
+
+    def sendall(self, data):
+        """Send all of the given data."""
+        if not self.enter():
+            raise IOError("Shared-memory connection closed")
+        try:
+            self.outgoing.write(data)
+        finally:
+            self.leave()
+
+    def shutdown(self, how=None):
+        """Mark the connection closed, so that the other side stops."""
+        if self.open:
+            self.incoming.set(SHM_CLOSED_OFFSET, 1)
+            self.outgoing.set(SHM_CLOSED_OFFSET, 1)
+
+    def close(self):
+        """
+        Close the connection. Threads still reading or writing see the closed
+        flag and return before the rings are unmapped.
+        """
+        with self.cond:
+            if not self.open:
+                return
+            self.shutdown()
+            self.open = False
+            while self.users:
+                self.cond.wait()
+            self.incoming.close()
+            self.outgoing.close()